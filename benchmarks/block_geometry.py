@@ -0,0 +1,70 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Compares per note block geometry in Python (the old _render_blocks loop) against
+the batched NumPy pass of Video._block_rects, on a dense synthetic piece.
+Run with "python benchmarks/block_geometry.py [notes] [frames]".
+"""
+
+import sys
+import time
+from synthetic_midi import dense_piece
+from pianovis import Video
+
+
+def scalar_block_rects(video, frame):
+    rects, color_inds = [], []
+    y_offset = video._res[1] / 2
+    speed = video._options["blocks.speed"]
+    active = video._notes[video._index.active(frame)]
+    for key, start, end, color_ind in zip(active.keys.tolist(), active.starts.tolist(), active.ends.tolist(),
+            active.colors.tolist()):
+        bottom_y = (frame-start)/video._fps*speed + y_offset
+        top_y = bottom_y - (end-start)/video._fps*speed
+        if bottom_y >= 0 and top_y <= y_offset:
+            rects.append((video._key_x[key], top_y, video._key_block_width[key]-1, bottom_y-top_y))
+            color_inds.append(color_ind)
+    return rects, color_inds
+
+
+def main():
+    args = list(map(int, sys.argv[1:3]))
+    num_notes, frames = args + [50000, 3000][len(args):]
+
+    video = Video((1920, 1080), 30, 0)
+    video._notes = dense_piece(num_notes, frames)
+    video._build_index()
+    visible = sum(len(video._block_rects(frame)[0]) for frame in range(0, frames, 10)) / len(range(0, frames, 10))
+    print(f"{num_notes} notes over {frames} frames, {visible:.0f} visible blocks per frame")
+
+    for name, func in (("python", scalar_block_rects), ("numpy", lambda video, frame: video._block_rects(frame))):
+        start = time.time()
+        for frame in range(frames):
+            func(video, frame)
+        elapse = time.time() - start
+        print(f"{name:>8}: {elapse/frames*1000:7.3f} ms/frame")
+
+    start = time.time()
+    for frame in range(0, frames, 10):
+        video._render_blocks(frame, [])
+    elapse = time.time() - start
+    print(f"{'draw':>8}: {elapse/len(range(0, frames, 10))*1000:7.3f} ms/frame (full _render_blocks)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Compares drawing blocks per frame against scrolling the pre-rendered waterfall strip
+("blocks.strip"), over increasingly dense synthetic pieces played frame by frame.
+First checks that both give the same frames on the dense workload of synthetic_midi.py, whose
+chords start on whole frames, so many block edges land exactly on pixel rows, and exits with 1 if not.
+Run with "python benchmarks/block_strip.py [frames]".
+"""
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pygame
+from synthetic_midi import dense_piece, write_midi
+from pianovis import Video
+
+
+def check_strip(options, seconds=20, samples=150):
+    """Returns frames (of samples spread over the dense workload) that differ between strip and direct drawing."""
+    with tempfile.TemporaryDirectory() as tmp:
+        midi = os.path.join(tmp, "dense.mid")
+        write_midi("dense", midi, seconds)
+        video = Video((1920, 1080), 30, 0)
+        video._midi_cache = None
+        video.add_midi(midi)
+        video._prep_render()
+
+    for path, value in options.items():
+        video.configure(path, value)
+    total = video._calc_num_frames()
+    differ = []
+    for frame in range(0, total, max(total // samples, 1)):
+        surfaces = []
+        for strip in (False, True):
+            video.configure("blocks.strip", strip)
+            surfaces.append(pygame.image.tobytes(video._render_blocks(frame, []), "RGBA"))
+        if surfaces[0] != surfaces[1]:
+            differ.append(frame)
+    return differ
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+
+    for options in ({}, {"blocks.border": 3}, {"blocks.motion_blur": False, "blocks.rounding": 0}):
+        if differ := check_strip(options):
+            print(f"Strip differs from direct drawing with {options} on frames {differ}")
+            sys.exit(1)
+    print("Strip matches direct drawing on the dense workload")
+
+    video = Video((1920, 1080), 30, 0)
+    for num_notes in (1000, 5000, 20000, 50000):
+        video._notes = dense_piece(num_notes, frames)
+        video._build_index()
+        visible = np.mean([len(video._block_rects(frame)[0]) for frame in range(0, frames, 10)])
+        print(f"{num_notes} notes over {frames} frames, {visible:.0f} visible blocks per frame")
+
+        for strip in (False, True):
+            video.configure("blocks.strip", strip)
+            start = time.time()
+            for frame in range(frames):
+                video._render_blocks(frame, [])
+            elapse = time.time() - start
+            print(f"{'strip' if strip else 'direct':>8}: {elapse/frames*1000:7.3f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
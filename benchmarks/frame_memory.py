@@ -0,0 +1,79 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Measures memory of rendering and converting frames for the encoder, with the layer pool
+against emptying the pool every frame (a new surface per layer, as before the pool).
+Reports layer allocations per frame, peak Python and NumPy memory per frame after the first
+(tracemalloc, surfaces themselves are allocated by SDL), and peak RSS of the process.
+Each mode runs in its own process so peak RSS is its own.
+Run with "python benchmarks/frame_memory.py [width] [height] [frames]". Peak RSS needs a Unix.
+"""
+
+import os
+import sys
+import time
+import resource
+import tracemalloc
+import subprocess
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+from synthetic_midi import dense_piece
+from pianovis import Video
+
+
+def measure(width, height, frames, fresh):
+    video = Video((width, height), 30, 0)
+    video._notes = dense_piece(frames*3, frames)
+    video._build_index()
+
+    # The first frame draws the idle keyboard and key sprites, which persist.
+    video._to_bgr(video._render(0))
+    tracemalloc.start()
+    peak = 0
+    start = time.time()
+    for frame in range(1, frames):
+        if fresh:
+            video._layers.clear()
+            video._frame_bgr = None
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        video._to_bgr(video._render(frame))
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    elapse = time.time() - start
+
+    info = video.layer_pool_info()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return f"allocs/frame {info['allocations']/frames:5.2f}  python peak/frame {peak/2**20:7.2f} MB  " \
+        f"peak rss {rss:7.1f} MB  {elapse/(frames-1)*1000:7.2f} ms/frame"
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ("pooled", "fresh"):
+        print(measure(*map(int, sys.argv[2:5]), sys.argv[1] == "fresh"))
+        return
+
+    args = list(map(int, sys.argv[1:4]))
+    width, height, frames = args + [1920, 1080, 200][len(args):]
+    print(f"{width}x{height}, {frames} frames")
+    for mode in ("pooled", "fresh"):
+        result = subprocess.run([sys.executable, __file__, mode, str(width), str(height), str(frames)],
+            capture_output=True, text=True, check=True)
+        print(f"{mode:>8}: {result.stdout.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Compares handing a rendered frame to the encoder through a temporary PNG
+(the old single core export path) against reading the surface pixel buffer.
+Run with "python benchmarks/frame_transfer.py [width] [height] [frames]".
+"""
+
+import os
+import sys
+import time
+import tempfile
+import pygame
+import cv2
+import synthetic_midi  # Puts the repository root on the path.
+from pianovis.encode import surface_to_bgr
+
+
+def png_round_trip(surface, path):
+    pygame.image.save(surface, path)
+    return cv2.imread(path)
+
+
+def main():
+    args = list(map(int, sys.argv[1:4]))
+    width, height, frames = args + [1920, 1080, 100][len(args):]
+    surface = pygame.Surface((width, height))
+    for i in range(0, width, 20):
+        pygame.draw.rect(surface, (i % 256, 128, 255 - i % 256), (i, 0, 15, height))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "frame.png")
+        for name, func in (("png", lambda: png_round_trip(surface, path)), ("buffer", lambda: surface_to_bgr(surface))):
+            start = time.time()
+            for _ in range(frames):
+                func()
+            elapse = time.time() - start
+            print(f"{name:>8}: {frames/elapse:8.1f} frames/s  {elapse/frames*1000:7.2f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Measures startup of pianovis in fresh interpreters, with no display and the dummy SDL driver,
+as on a render node. Importing pianovis should not load pygame, opencv or tkinter, nor open
+anything; they come in when Video is first used.
+Run with "python benchmarks/import_time.py [runs] [max_ms]", exits with 1 if the median
+"import pianovis" time is over max_ms.
+"""
+
+import os
+import sys
+import statistics
+import subprocess
+
+STATEMENTS = (
+    ("import pianovis", "import pianovis"),
+    ("import Video", "from pianovis import Video"),
+    ("create Video", "from pianovis import Video; Video((1920, 1080), 30, 1)"),
+)
+CHECK = "import sys, pianovis; print(' '.join(m for m in ('pygame', 'cv2', 'tkinter', 'mido') if m in sys.modules))"
+
+
+def time_statement(statement, env):
+    code = f"import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)"
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout
+    return float(out.split()[-1]) * 1000
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    max_ms = float(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    env.pop("DISPLAY", None)
+    root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (root, env.get("PYTHONPATH"))))
+
+    medians = {}
+    for name, statement in STATEMENTS:
+        times = [time_statement(statement, env) for _ in range(runs)]
+        medians[name] = statistics.median(times)
+        print(f"{name:>16}: {medians[name]:8.1f} ms median  {min(times):8.1f} ms min")
+
+    loaded = subprocess.run([sys.executable, "-c", CHECK], env=env, capture_output=True, text=True, check=True).stdout.split()
+    print(f"Loaded by import pianovis: {', '.join(loaded) or 'none of pygame, cv2, tkinter, mido'}")
+
+    if max_ms is not None and medians["import pianovis"] > max_ms:
+        print(f"import pianovis took over {max_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Benchmark suite over the synthetic midi workloads of synthetic_midi.py. For each workload, in its
+own process, measures midi parse time, frames per second of Video._render, _render_blocks and
+_render_piano, end to end export throughput with one and with several cores, and peak memory.
+Results are written as JSON, and compared against an earlier results file with --compare,
+exiting with 1 if any metric got worse by more than --threshold.
+Run with "python benchmarks/suite.py [--out results.json] [--compare old.json]", see --help.
+Exports need ffmpeg on the path to exercise the segment encoder, otherwise opencv is used.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+from synthetic_midi import ROOT, WORKLOADS, write_midi
+
+# Metrics where lower is better, all others are rates where higher is better.
+LOWER_BETTER = ("parse_ms", "peak_rss_mb", "export_peak_rss_mb")
+
+
+def time_frames(func, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        func(frame)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def run_workload(midi, args):
+    """Returns metrics of one workload, run in a fresh process so peak memory is its own."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    from pianovis import Video
+    from pianovis.midi import parse_midi
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        parse_midi(midi, args.fps, 0)
+    result = {"parse_ms": (time.perf_counter()-start) / args.repeat * 1000}
+
+    video = Video(args.resolution, args.fps, 0)
+    video._midi_cache = None
+    video.add_midi(midi)
+    video._prep_render()
+    result["notes"] = len(video._notes)
+    total = video._calc_num_frames()
+    frames = list(range(0, total, max(total // args.frames, 1)))[:args.frames]
+
+    # Warm up key sprites and layers, then time each stage over the same frames.
+    video._render(frames[0])
+    playing = {frame: video._index.playing(frame) for frame in frames}
+    result["render_fps"] = time_frames(video._render, frames)
+    result["blocks_fps"] = time_frames(lambda frame: video._render_blocks(frame, playing[frame]), frames)
+    result["piano_fps"] = time_frames(lambda frame: video._render_piano(playing[frame]), frames)
+
+    if not args.skip_export:
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, cores in (("export_fps_single", 1), ("export_fps_multi", args.cores)):
+                video = Video(args.export_resolution, args.fps, 0)
+                video._midi_cache = None
+                video.add_midi(midi)
+                metrics = video.export(os.path.join(tmp, f"{name}.mp4"), multicore=cores > 1, max_cores=cores)
+                result[name] = metrics.report()["fps"]
+        result["export_peak_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def compare(results, old, threshold):
+    """Prints change of each metric against old results, returns whether any got worse than threshold."""
+    worse = False
+    print(f"\nCompared to {old['meta']['date']} ({old['meta'].get('commit') or 'unknown commit'}):")
+    for workload, metrics in results["workloads"].items():
+        for name, value in metrics.items():
+            base = old["workloads"].get(workload, {}).get(name)
+            if name == "notes" or not base:
+                continue
+            change = value/base - 1
+            regression = change > threshold if name in LOWER_BETTER else change < -threshold
+            worse |= regression
+            mark = "  REGRESSION" if regression else ""
+            print(f"{workload:>10} {name:>20}: {base:10.2f} -> {value:10.2f} ({change*100:+6.1f}%){mark}")
+    return worse
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="PianoVis benchmark suite.")
+    parser.add_argument("--out", default="benchmark_results.json", help="path to write results to")
+    parser.add_argument("--compare", help="earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--scale", type=float, default=1, help="factor of the default length of each piece")
+    parser.add_argument("--resolution", type=int, nargs=2, default=(1920, 1080))
+    parser.add_argument("--export-resolution", type=int, nargs=2, default=(640, 360))
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--frames", type=int, default=300, help="frames timed per render stage")
+    parser.add_argument("--repeat", type=int, default=3, help="times each midi is parsed")
+    parser.add_argument("--cores", type=int, default=min(multiprocessing.cpu_count(), 4), help="cores of multi core export")
+    parser.add_argument("--skip-export", action="store_true")
+    parser.add_argument("--worker", nargs=2, metavar=("MIDI", "OUT"), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.worker is not None:
+        sys.stdout = sys.stderr  # Keeps export progress out of the way of the parent.
+        with open(args.worker[1], "w") as file:
+            json.dump(run_workload(args.worker[0], args), file)
+        return
+
+    results = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": multiprocessing.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("worker", "out", "compare")},
+        },
+        "workloads": {},
+    }
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (ROOT, os.environ.get("PYTHONPATH")))))
+    with tempfile.TemporaryDirectory() as tmp:
+        for workload in args.workloads:
+            midi = os.path.join(tmp, f"{workload}.mid")
+            out = os.path.join(tmp, f"{workload}.json")
+            write_midi(workload, midi, WORKLOADS[workload]*args.scale)
+            subprocess.run([sys.executable, os.path.realpath(__file__), *sys.argv[1:], "--worker", midi, out],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            with open(out) as file:
+                metrics = results["workloads"][workload] = json.load(file)
+            print(f"{workload:>10}: " + "  ".join(f"{k} {v:.1f}" if isinstance(v, float) else f"{k} {v}"
+                for k, v in metrics.items()))
+
+    with open(args.out, "w") as file:
+        json.dump(results, file, indent=4)
+    print(f"Wrote results to {args.out}")
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            old = json.load(file)
+        if compare(results, old, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Writes synthetic midis for benchmarks, each stressing one part of parsing and rendering:
+sparse (one melody line), dense (big fast chords), sustained (long overlapping notes),
+long (melody and accompaniment for a long piece) and tempo (melody and accompaniment with a tempo change every eighth of a beat).
+Pieces are seeded, so the same arguments always write the same file.
+dense_piece makes notes directly, for benchmarks that skip parsing.
+Importing this puts the repository root on the path, so benchmarks run from a checkout.
+Run with "python benchmarks/synthetic_midi.py workload path [seconds] [seed]".
+"""
+
+import os
+import sys
+import numpy as np
+import mido
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from pianovis.notes import NoteStore
+
+TICKS_PER_BEAT = 480
+# Length of each workload in seconds, at scale 1.
+WORKLOADS = {"sparse": 60, "dense": 60, "sustained": 60, "long": 600, "tempo": 60}
+
+
+def sparse(rng, beats):
+    """One note per beat, wandering around the middle of the piano."""
+    keys = np.clip(60 + np.cumsum(rng.integers(-4, 5, beats)), 36, 96)
+    return [(key, beat, 0.9) for beat, key in enumerate(keys.tolist())]
+
+
+def dense(rng, beats):
+    """Chords of 6 to 10 notes on every sixteenth, spread over the whole piano."""
+    notes = []
+    for step in range(beats*4):
+        for key in rng.choice(np.arange(21, 109), rng.integers(6, 11), replace=False).tolist():
+            notes.append((key, step/4, 0.25))
+    return notes
+
+
+def sustained(rng, beats):
+    """Notes held 8 to 40 beats, several starting every beat, so many blocks are on screen at once."""
+    notes = []
+    for beat in range(beats):
+        for key in rng.integers(21, 109, 3).tolist():
+            notes.append((key, beat + rng.random(), float(rng.uniform(8, 40))))
+    return notes
+
+
+def long_piece(rng, beats):
+    """Melody over broken chords, a typical piano piece."""
+    notes = sparse(rng, beats)
+    for beat in range(beats):
+        root = 36 + int(rng.integers(0, 12))
+        for i, interval in enumerate((0, 7, 12, 16)):
+            notes.append((root + interval, beat + i/4, 0.25))
+    return notes
+
+
+GENERATORS = {"sparse": sparse, "dense": dense, "sustained": sustained, "long": long_piece, "tempo": long_piece}
+
+
+def write_midi(workload, path, seconds=None, seed=0):
+    """
+    Writes midi of workload to path.
+    :param workload: One of WORKLOADS.
+    :param seconds: Length of piece, the workload's default if None.
+    :param seed: Random seed.
+    """
+    seconds = WORKLOADS[workload] if seconds is None else seconds
+    rng = np.random.default_rng(seed)
+    beats = max(int(seconds * 2), 1)  # 120 bpm, the tempo workload averages about the same.
+    notes = GENERATORS[workload](rng, beats)
+
+    # Note offs sort before note ons on the same tick, so repeated keys pair up.
+    events = []
+    for key, start, length in notes:
+        events.append((int(start*TICKS_PER_BEAT), 1, mido.Message("note_on", note=key, velocity=80)))
+        events.append((int((start+length)*TICKS_PER_BEAT), 0, mido.Message("note_off", note=key, velocity=0)))
+    events.sort(key=lambda x: (x[0], x[1]))
+
+    tempo_track = mido.MidiTrack()
+    tempo_track.append(mido.MetaMessage("set_tempo", tempo=500000, time=0))
+    if workload == "tempo":
+        for _ in range(beats*8):
+            bpm = float(rng.uniform(60, 180))
+            tempo_track.append(mido.MetaMessage("set_tempo", tempo=int(60000000/bpm), time=TICKS_PER_BEAT//8))
+
+    note_track = mido.MidiTrack()
+    last_tick = 0
+    for tick, _, msg in events:
+        note_track.append(msg.copy(time=tick-last_tick))
+        last_tick = tick
+
+    midi = mido.MidiFile(ticks_per_beat=TICKS_PER_BEAT)
+    midi.tracks.extend((tempo_track, note_track))
+    midi.save(path)
+    return len(notes)
+
+
+def dense_piece(notes, frames, seed=0):
+    """
+    Returns notes random notes on any key, starting within frames and held 2 to 60 frames.
+    :param seed: Random seed.
+    """
+    rng = np.random.default_rng(seed)
+    starts = rng.uniform(0, frames, notes)
+    midi = np.stack([rng.integers(0, 88, notes), starts, starts + rng.uniform(2, 60, notes)], axis=1)
+    return NoteStore.from_midis([midi])
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in WORKLOADS:
+        print(f"Usage: python synthetic_midi.py {{{','.join(WORKLOADS)}}} path [seconds] [seed]")
+        sys.exit(1)
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else None
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    num_notes = write_midi(sys.argv[1], sys.argv[2], seconds, seed)
+    print(f"Wrote {num_notes} notes to {sys.argv[2]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,24 @@
 #
 # ##### END GPL LICENSE BLOCK #####
 
+import importlib
+from . import constants as _constants
 from .constants import *
-from .video import Video
-from . import app
+
+__all__ = [name for name in vars(_constants) if name.isupper()] + ["Video", "app", "LOGO"]
+
+
+def __getattr__(name):
+    # Video pulls in pygame, opencv and mido, so it and the app are imported on first use.
+    if name == "Video":
+        from .video import Video
+        return Video
+    if name == "app":
+        return importlib.import_module(".app", __name__)
+    if name == "LOGO":
+        return get_logo()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
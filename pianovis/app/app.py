@@ -18,12 +18,8 @@
 import os
 import pygame
 import threading
-from tkinter import Tk
-from tkinter.filedialog import askopenfilename, askopenfilenames, asksaveasfilename
 from ..video import Video
 from ..utils import PreciseClock
-pygame.init()
-Tk().withdraw()
 
 BLACK = (0, 0, 0)
 GRAY_DARK = (64, 64, 64)
@@ -31,8 +27,23 @@ GRAY = (128, 128, 128)
 GRAY_LIGHT = (192, 192, 192)
 WHITE = (255, 255, 255)
 
-FONT_SMALL = pygame.font.SysFont("ubuntu", 14)
-FONT_MED = pygame.font.SysFont("ubuntu", 20)
+# Set by launch, pygame and tkinter are only started once the app opens.
+FONT_SMALL = None
+FONT_MED = None
+_tk_root = None
+
+
+def ask_file(dialog):
+    """
+    Runs a tkinter file dialog, creating the hidden Tk root on first use.
+    :param dialog: Name of the function in tkinter.filedialog.
+    """
+    global _tk_root
+    from tkinter import Tk, filedialog
+    if _tk_root is None:
+        _tk_root = Tk()
+        _tk_root.withdraw()
+    return getattr(filedialog, dialog)()
 
 
 class Text:
@@ -77,11 +88,10 @@ class Button:
 
 
 class VideoDisp:
-    button_export = Button(FONT_MED.render("Export", 1, BLACK))
-    button_clear_midis = Button(FONT_MED.render("Clear MIDIs", 1, BLACK))
-    button_load_midi = Button(FONT_MED.render("Load MIDIs", 1, BLACK))
-
     def __init__(self):
+        self.button_export = Button(FONT_MED.render("Export", 1, BLACK))
+        self.button_clear_midis = Button(FONT_MED.render("Clear MIDIs", 1, BLACK))
+        self.button_load_midi = Button(FONT_MED.render("Load MIDIs", 1, BLACK))
         self.video = Video((1920, 1080), 30, 1)
         self.time = 0
         self.frame = 0
@@ -89,17 +99,36 @@ class VideoDisp:
         self.arrow_hold = 0
         self.exporting = False
         self.export_thread = None
+        self.frame_cache = (None, None)
+
+    def render(self, size, tier):
+        """
+        Returns frame rendered at size, reusing the last one if the frame, size, tier, options and notes
+        are unchanged, so a paused app does not render.
+        """
+        key = (self.frame, tuple(size), tier, self.video._options_version, self.video._notes)
+        if self.frame_cache[0] != key:
+            surface = self.video._tier_video(tier, size)._render(self.frame)
+            if surface.get_size() != tuple(size):
+                surface = pygame.transform.scale(surface, size)
+            self.frame_cache = (key, surface)
+        return self.frame_cache[1]
 
     def draw(self, window, events, loc, size):
-        surface = pygame.transform.scale(self.video._render(self.frame), size)
-        window.blit(surface, loc)
+        keys = pygame.key.get_pressed()
+        scrubbing = (keys[pygame.K_RIGHT] or keys[pygame.K_LEFT]) and self.time-self.arrow_hold > 20
+        tier = "preview" if self.playing or scrubbing else "final"
+        window.blit(self.render(size, tier), loc)
         pygame.draw.rect(window, WHITE, (*loc, *size), 1)
 
         window.blit(FONT_SMALL.render(f"Frame: {self.frame}", 1, WHITE), (loc[0]+10, loc[1]+10))
+        stats = self.video.note_stats(self.frame)
+        stats_msg = f"Notes: {stats['played']} played, {stats['playing']} playing, {stats['to_play']} to play"
+        window.blit(FONT_SMALL.render(stats_msg, 1, WHITE), (loc[0]+10, loc[1]+30))
 
 
         if self.button_export.draw(window, events, (loc[0]+size[0]+100, loc[1]), (160, 40)):
-            if not self.exporting and (path:=asksaveasfilename()):
+            if not self.exporting and (path:=ask_file("asksaveasfilename")):
                 self.exporting = True
                 self.export_thread = threading.Thread(target=self.video.export, args=(path, True))
                 self.export_thread.start()
@@ -107,7 +136,7 @@ class VideoDisp:
             self.video._midi_paths = []
             self.video._prep_render()
         if self.button_load_midi.draw(window, events, (loc[0]+size[0]+100, loc[1]+100), (160, 40)):
-            self.video._midi_paths.extend(askopenfilenames())
+            self.video._midi_paths.extend(ask_file("askopenfilenames"))
             self.video._midi_paths = list(set(self.video._midi_paths))
             self.video._prep_render()
         for i, path in enumerate(self.video._midi_paths):
@@ -116,7 +145,7 @@ class VideoDisp:
             window.blit(text, (loc[0]+size[0]+20, loc[1]+170+i*20))
 
         if self.exporting:
-            window.blit(FONT_SMALL.render("Exporting, look at the console for info.", 1, WHITE), (loc[0]+10, loc[1]+30))
+            window.blit(FONT_SMALL.render("Exporting, look at the console for info.", 1, WHITE), (loc[0]+10, loc[1]+50))
             if not self.export_thread.is_alive():
                 self.exporting = False
             return
@@ -152,6 +181,11 @@ def launch(resizable=True):
     Starts pianovis app.
     :param resizable: Make the window resizable?
     """
+    global FONT_SMALL, FONT_MED
+    pygame.init()
+    FONT_SMALL = pygame.font.SysFont("ubuntu", 14)
+    FONT_MED = pygame.font.SysFont("ubuntu", 20)
+
     pygame.display.set_caption("Piano Visualizer - App")
     if resizable:
         window = pygame.display.set_mode((1280, 720), pygame.RESIZABLE)
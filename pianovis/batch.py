@@ -0,0 +1,202 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import os
+import json
+import time
+import shutil
+import traceback
+import multiprocessing
+import pygame
+from queue import Empty
+from typing import Dict, List, Optional
+from colorama import Fore
+from .encode import FFmpegWriter
+from .farm import load_manifest, load_video, merge, plan
+from .utils import ProgressLine, init_console, print_process
+from .video import Video
+
+
+def load_jobs(path: str) -> List[Dict]:
+    """
+    Returns job specs from a JSON file holding a list of them, or a JSON lines file with one per line.
+    Each spec has "output" and "midis", and optionally "audio", "resolution", "fps", "offset",
+    "decor" (image path) and "options" (option path to value).
+    """
+    with open(path) as file:
+        text = file.read()
+    try:
+        jobs = json.loads(text)
+    except json.JSONDecodeError:
+        jobs = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(jobs, dict):
+        jobs = [jobs]
+
+    for i, job in enumerate(jobs):
+        missing = [x for x in ("output", "midis") if x not in job]
+        if missing:
+            raise ValueError(f"Job {i} is missing {', '.join(missing)}")
+    return jobs
+
+
+def job_video(job: Dict) -> Video:
+    """Returns a video set up from a job spec."""
+    decor = None if job.get("decor") is None else pygame.image.load(job["decor"])
+    video = Video(tuple(job.get("resolution", (1920, 1080))), job.get("fps", 30), job.get("offset", 1), decor)
+    for path in job["midis"]:
+        video.add_midi(path)
+    if job.get("audio") is not None:
+        video.set_audio(job["audio"])
+    for path, value in job.get("options", {}).items():
+        video.configure(path, value)
+    return video
+
+
+def _worker(tasks, results):
+    """Renders (job, manifest, chunk) tasks until None, keeping the video of the last job loaded."""
+    loaded, video = None, None
+    while (task := tasks.get()) is not None:
+        job, manifest_path, index = task
+        start = time.time()
+        try:
+            if manifest_path != loaded:
+                manifest = load_manifest(manifest_path)
+                video = load_video(manifest)
+                loaded = manifest_path
+            chunk = manifest["chunks"][index]
+            for _ in video._render_segment(chunk["path"], chunk["start"], chunk["end"]):
+                pass
+            results.put((job, index, start, time.time(), None))
+        except Exception:
+            loaded = None
+            results.put((job, index, start, time.time(), traceback.format_exc()))
+
+
+def _finish_job(report, directory, start):
+    """Merges a job whose chunks are all rendered, and fills in its throughput."""
+    if report["error"] is None:
+        try:
+            merge(os.path.join(directory, "manifest.json"))
+            shutil.rmtree(directory)
+        except Exception as e:
+            report["error"] = f"merging failed: {str(e) or type(e).__name__}"
+    if report["error"] is not None:
+        print(Fore.RED + f"{report['output']} failed, {report['error']}" + Fore.WHITE)
+        return
+
+    report["elapse"] = time.time() - start
+    report["fps"] = report["frames"] / report["elapse"]
+    print(f"{report['output']}: {report['frames']} frames in {report['elapse']:.1f}s, {report['fps']:.1f} fps "
+        f"({report['frames']/report['render_seconds']:.1f} fps per core)")
+
+
+def run_batch(jobs: List[Dict], cores: int = multiprocessing.cpu_count(), work_dir: str = ".pianovis_batch",
+        chunk_frames: Optional[int] = None) -> List[Dict]:
+    """
+    Exports many videos with one pool of render processes. Every job is planned up front, parsing
+    its midis once, and the chunks of all jobs share the pool in job order, so cores move on to the
+    next job while the last chunks of one finish. Each job is merged as soon as its chunks are done.
+    :param jobs: Job specs, see load_jobs.
+    :param cores: Number of render processes, the core budget of the whole batch.
+    :param work_dir: Directory for job manifests and chunks, removed per job once it is merged.
+    :param chunk_frames: Frames per chunk, same as export segments if None.
+    :return: Result of each job: output, frames, elapse (seconds from its first chunk starting
+        to being merged), fps, render_seconds (summed over cores), and error if it failed.
+    """
+    if not FFmpegWriter.available():
+        raise RuntimeError("ffmpeg not found, it is needed for batch exports.")
+    if chunk_frames is not None and chunk_frames < 1:
+        raise ValueError("chunk_frames must be positive")
+    init_console()
+
+    reports, manifests = [], []
+    for i, job in enumerate(jobs):
+        reports.append({"output": job["output"], "frames": 0, "elapse": 0.0, "fps": 0.0, "render_seconds": 0.0,
+            "error": None})
+        directory = os.path.join(work_dir, str(i))
+        try:
+            manifest = load_manifest(plan(job_video(job), job["output"], directory, chunk_frames))
+            if not manifest["chunks"]:
+                raise ValueError("no chunks to render")
+            manifests.append(manifest)
+            reports[i]["frames"] = manifest["frames"]
+        except Exception as e:
+            # Anything a bad spec or midi raises (e.g. EOFError from a truncated file) fails only its job.
+            shutil.rmtree(directory, ignore_errors=True)
+            manifests.append({"frames": 0, "chunks": []})
+            reports[i]["error"] = f"planning failed: {str(e) or type(e).__name__}"
+            print(Fore.RED + f"{job['output']} failed, {reports[i]['error']}" + Fore.WHITE)
+
+    tasks, results = multiprocessing.Queue(), multiprocessing.Queue()
+    num_tasks = 0
+    for i, manifest in enumerate(manifests):
+        for index in range(len(manifest["chunks"])):
+            tasks.put((i, os.path.join(work_dir, str(i), "manifest.json"), index))
+            num_tasks += 1
+    cores = max(min(cores, num_tasks), 1)
+    for _ in range(cores):
+        tasks.put(None)
+    processes = [multiprocessing.Process(target=_worker, args=(tasks, results)) for _ in range(cores)]
+    for process in processes:
+        process.start()
+
+    print(f"Rendering {len(jobs)} jobs in {num_tasks} chunks on {cores} cores.")
+    remaining = [len(x["chunks"]) for x in manifests]
+    first_start = [None] * len(jobs)
+    total_frames = sum(x["frames"] for x in manifests)
+    frames_done = 0
+    progress = ProgressLine(total_frames)
+    try:
+        while any(remaining):
+            try:
+                job, index, start, end, error = results.get(timeout=1)
+            except Empty:
+                if not any(p.is_alive() for p in processes):
+                    for i in range(len(jobs)):
+                        if remaining[i] and reports[i]["error"] is None:
+                            reports[i]["error"] = "render processes exited before finishing its chunks"
+                    break
+                continue
+
+            chunk = manifests[job]["chunks"][index]
+            report = reports[job]
+            first_start[job] = start if first_start[job] is None else min(first_start[job], start)
+            report["render_seconds"] += end - start
+            frames_done += chunk["end"] - chunk["start"]
+            remaining[job] -= 1
+            if error is not None and report["error"] is None:
+                report["error"] = f"chunk {index}: {error}"
+            if remaining[job] == 0:
+                progress.clear()
+                _finish_job(report, os.path.join(work_dir, str(job)), first_start[job])
+            progress.update(f"Batch: {frames_done} of {total_frames} frames", frames_done)
+        progress.clear()
+
+    except BaseException as e:
+        for process in processes:
+            process.terminate()
+        if isinstance(e, KeyboardInterrupt):
+            print(Fore.RED + "Keyboard Interrupt." + Fore.WHITE)
+        raise
+
+    for process in processes:
+        process.join()
+    failed = sum(x["error"] is not None for x in reports)
+    print_process.finish(f"Finished {len(jobs)-failed} of {len(jobs)} jobs.")
+    if os.path.isdir(work_dir) and not os.listdir(work_dir):
+        os.rmdir(work_dir)
+    return reports
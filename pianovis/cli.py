@@ -0,0 +1,139 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""
+Command line interface, installed as "pianovis".
+Render farm: "pianovis plan" parses midis and writes a job manifest, "pianovis render" renders
+chunks of it (run it on any number of processes or hosts sharing the job directory), and
+"pianovis merge" joins the chunks into the final video.
+"pianovis batch" exports a queue of videos on one shared pool of render processes.
+"""
+
+import sys
+import json
+import argparse
+import multiprocessing
+from typing import List, Optional
+
+
+def parse_option(text):
+    """Parses a "path=value" option, with value as JSON, or a plain string if it is not JSON."""
+    path, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Option {text} must be path=value")
+    try:
+        return path, json.loads(value)
+    except json.JSONDecodeError:
+        return path, value
+
+
+def cmd_plan(args):
+    from .farm import plan
+    from .video import Video
+
+    video = Video(tuple(args.resolution), args.fps, args.offset)
+    for path in args.midi:
+        video.add_midi(path)
+    if args.audio is not None:
+        video.set_audio(args.audio)
+    for path, value in args.option:
+        video.configure(path, value)
+    plan(video, args.output, args.directory, args.chunk_frames)
+
+
+def cmd_render(args):
+    from .farm import render
+
+    rendered = render(args.manifest, args.chunk)
+    print(f"Rendered {rendered} chunks.")
+
+
+def cmd_merge(args):
+    from .farm import merge
+
+    merge(args.manifest)
+
+
+def cmd_status(args):
+    from .farm import chunk_status, load_manifest
+
+    status = chunk_status(load_manifest(args.manifest))
+    for name in ("done", "claimed", "todo"):
+        indices = [str(i) for i, x in enumerate(status) if x == name]
+        print(f"{name:>8}: {len(indices)} of {len(status)}" + (f" ({', '.join(indices)})" if indices and name != "done" else ""))
+
+
+def cmd_batch(args):
+    from .batch import load_jobs, run_batch
+
+    reports = run_batch(load_jobs(args.jobs), args.cores, args.work_dir, args.chunk_frames)
+    if args.report is not None:
+        with open(args.report, "w") as file:
+            json.dump(reports, file, indent=4)
+    if any(x["error"] is not None for x in reports):
+        raise RuntimeError(f"{sum(x['error'] is not None for x in reports)} of {len(reports)} jobs failed.")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pianovis", description="PianoVis piano video exporter.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sub = commands.add_parser("plan", help="parse midis and write a render farm job manifest")
+    sub.add_argument("directory", help="job directory, shared by all workers")
+    sub.add_argument("output", help="path of the final video (mp4)")
+    sub.add_argument("--midi", nargs="+", required=True, help="midi files")
+    sub.add_argument("--audio", help="audio file")
+    sub.add_argument("--resolution", type=int, nargs=2, default=(1920, 1080), metavar=("X", "Y"))
+    sub.add_argument("--fps", type=int, default=30)
+    sub.add_argument("--offset", type=int, default=1, help="offset (frames) of video from audio")
+    sub.add_argument("--chunk-frames", type=int, help="frames per chunk")
+    sub.add_argument("--option", type=parse_option, action="append", default=[], metavar="PATH=VALUE",
+        help="video option, value as JSON, e.g. blocks.motion_blur=false")
+    sub.set_defaults(func=cmd_plan)
+
+    sub = commands.add_parser("render", help="render chunks of a manifest")
+    sub.add_argument("manifest")
+    sub.add_argument("--chunk", type=int, nargs="+", help="chunks to render, by default claims unclaimed ones until none are left")
+    sub.set_defaults(func=cmd_render)
+
+    sub = commands.add_parser("merge", help="join the rendered chunks of a manifest and mux the audio")
+    sub.add_argument("manifest")
+    sub.set_defaults(func=cmd_merge)
+
+    sub = commands.add_parser("status", help="show which chunks of a manifest are done")
+    sub.add_argument("manifest")
+    sub.set_defaults(func=cmd_status)
+
+    sub = commands.add_parser("batch", help="export many videos sharing one pool of render processes")
+    sub.add_argument("jobs", help="JSON list of job specs, or JSON lines with one per line")
+    sub.add_argument("--cores", type=int, default=multiprocessing.cpu_count(), help="render processes for the whole batch")
+    sub.add_argument("--work-dir", default=".pianovis_batch", help="directory for chunks, removed once jobs finish")
+    sub.add_argument("--chunk-frames", type=int, help="frames per chunk")
+    sub.add_argument("--report", help="path to write per job throughput to as JSON")
+    sub.set_defaults(func=cmd_batch)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Runs the command line interface with argv (sys.argv if None), returns the exit code."""
+    args = build_parser().parse_args(argv)
+    try:
+        args.func(args)
+    except (RuntimeError, ValueError, OSError) as e:
+        print(f"pianovis {args.command}: {e}", file=sys.stderr)
+        return 1
+    return 0
@@ -16,17 +16,30 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import os
-import pygame
-pygame.init()
 
 
 # General
 PARENT = os.path.realpath(os.path.dirname(__file__))
-try:
-    LOGO = pygame.image.load(os.path.join(PARENT, "images", "logo.png"))
-except:
-    print("Could not load logo image.")
-    LOGO = pygame.Surface((100, 100))
+_logo = None
+
+
+def get_logo():
+    """Returns the logo image, loaded on first use so importing pianovis does not need pygame."""
+    global _logo
+    if _logo is None:
+        import pygame
+        try:
+            _logo = pygame.image.load(os.path.join(PARENT, "images", "logo.png"))
+        except:
+            print("Could not load logo image.")
+            _logo = pygame.Surface((100, 100))
+    return _logo
+
+
+def __getattr__(name):
+    if name == "LOGO":
+        return get_logo()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # Colors
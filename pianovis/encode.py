@@ -0,0 +1,222 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import os
+import sys
+import shutil
+import subprocess
+import multiprocessing
+import numpy as np
+import pygame
+import cv2
+from multiprocessing import shared_memory
+from typing import Callable, Iterator, List, Optional, Tuple
+
+
+def surface_to_bgr(surface: pygame.Surface, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Returns a (height, width, 3) BGR array of a surface, as expected by cv2.VideoWriter.
+    32 bit surfaces stored as BGRX in memory are read straight from the pixel buffer and
+    converted with a single copy, other formats are copied through pygame.surfarray.
+    :param surface: Surface to convert.
+    :param out: Array to write the frame into, allocated if None.
+    """
+    width, height = surface.get_size()
+    little = sys.byteorder == "little"
+    bgrx = surface.get_bytesize() == 4 and surface.get_shifts()[:3] == ((16, 8, 0) if little else (8, 16, 24))
+
+    if bgrx:
+        buffer = np.frombuffer(surface.get_buffer(), np.uint8)
+        view = buffer.reshape(height, surface.get_pitch()//4, 4)[:, :width]
+        frame = cv2.cvtColor(view, cv2.COLOR_BGRA2BGR, dst=out)
+        # Views lock the surface, release them before it is drawn on again.
+        del buffer, view
+    else:
+        rgb = pygame.surfarray.array3d(surface).transpose(1, 0, 2)
+        if out is None:
+            frame = np.ascontiguousarray(rgb[..., ::-1])
+        else:
+            frame = out
+            np.copyto(frame, rgb[..., ::-1])
+
+    return frame
+
+
+class FFmpegWriter:
+    """
+    Video writer that streams raw BGR frames into an ffmpeg process over stdin.
+    Audio is muxed in the same pass, so no intermediate video file is written.
+    Has the same write() and release() interface as cv2.VideoWriter.
+    """
+
+    def __init__(self, path: str, resolution: Tuple[int, int], fps: int, audio_path: Optional[str] = None,
+            codec: str = "libx264", preset: str = "medium", crf: int = 18) -> None:
+        """
+        Starts ffmpeg.
+        :param path: Output video path.
+        :param resolution: Resolution (x, y) of frames.
+        :param fps: Frames per second of video.
+        :param audio_path: Audio file to mux, or None for no audio.
+        :param codec: ffmpeg video codec.
+        :param preset: Encoder preset, ignored if None.
+        :param crf: Constant rate factor, ignored if None.
+        """
+        self.path = path
+        self._proc = subprocess.Popen(self.command(path, resolution, fps, audio_path, codec, preset, crf),
+            stdin=subprocess.PIPE)
+
+    @staticmethod
+    def available() -> bool:
+        """Returns whether ffmpeg is on the path."""
+        return shutil.which("ffmpeg") is not None
+
+    @staticmethod
+    def command(path: str, resolution: Tuple[int, int], fps: int, audio_path: Optional[str] = None,
+            codec: str = "libx264", preset: str = "medium", crf: int = 18) -> List[str]:
+        """Returns the ffmpeg command line, see __init__ for parameters."""
+        command = ["ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", "{}x{}".format(*resolution), "-r", str(fps), "-i", "-"]
+        if audio_path is not None:
+            command += ["-i", audio_path, "-map", "0:v", "-map", "1:a", "-filter:a", "aresample=async=1", "-c:a", "aac"]
+
+        command += ["-c:v", codec, "-pix_fmt", "yuv420p"]
+        if preset is not None:
+            command += ["-preset", preset]
+        if crf is not None:
+            command += ["-crf", str(crf)]
+        command.append(path)
+        return command
+
+    def write(self, frame: np.ndarray) -> None:
+        """Writes a (height, width, 3) BGR frame."""
+        self._proc.stdin.write(np.ascontiguousarray(frame).data)
+
+    def release(self) -> None:
+        """Finishes the video and waits for ffmpeg to exit."""
+        self._proc.stdin.close()
+        if self._proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {self._proc.returncode} while writing {self.path}")
+
+    def terminate(self) -> None:
+        """Stops ffmpeg without finishing the video."""
+        self._proc.kill()
+        self._proc.wait()
+
+
+def concat_segments(paths: List[str], path: str, audio_path: Optional[str] = None) -> None:
+    """
+    Joins video segments into one video by stream copy, muxing audio in the same pass.
+    :param paths: Segment paths, in order. Segments must share codec, resolution and fps.
+    :param path: Output video path.
+    :param audio_path: Audio file to mux, or None for no audio.
+    """
+    if not paths:
+        raise ValueError(f"No segments to join into {path}")
+    list_path = os.path.join(os.path.dirname(paths[0]), "segments.txt")
+    with open(list_path, "w") as file:
+        for segment in paths:
+            escaped = os.path.realpath(segment).replace("'", "'\\''")
+            file.write(f"file '{escaped}'\n")
+
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_path is not None:
+        command += ["-i", audio_path, "-map", "0:v", "-map", "1:a", "-filter:a", "aresample=async=1", "-c:a", "aac"]
+    command += ["-c:v", "copy", path]
+
+    if subprocess.run(command).returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to join segments into {path}")
+
+
+class FrameRing:
+    """
+    Bounded ring of raw BGR frames in shared memory, for render workers feeding one encoder.
+    Frame numbers are handed out in order with take(). Frame f goes in slot f % slots, and a
+    worker waits until the encoder has consumed frame f - slots before writing it, so memory
+    stays bounded and a slow encoder holds back rendering.
+    """
+
+    def __init__(self, resolution: Tuple[int, int], slots: int) -> None:
+        """
+        Initializes ring buffer.
+        :param resolution: Resolution (x, y) of frames.
+        :param slots: Number of frames the ring holds.
+        """
+        width, height = resolution
+        self.shape = (height, width, 3)
+        self.slots = slots
+        self._frame_size = width * height * 3
+        self._shm = shared_memory.SharedMemory(create=True, size=self._frame_size*slots)
+        self._cond = multiprocessing.Condition()
+        self._slot_frames = multiprocessing.Array("q", range(slots), lock=False)
+        self._ready = multiprocessing.Array("b", slots, lock=False)
+        self._next = multiprocessing.Value("q", 0, lock=False)
+
+    def _view(self, slot):
+        return np.ndarray(self.shape, np.uint8, self._shm.buf, slot*self._frame_size)
+
+    def take(self, frames: int) -> Optional[int]:
+        """Returns the next frame to render, or None once all frames are handed out."""
+        with self._cond:
+            frame = self._next.value
+            if frame >= frames:
+                return None
+            self._next.value += 1
+            return frame
+
+    def put(self, frame: int, surface: pygame.Surface) -> None:
+        """Waits for the slot of frame to be free, then writes surface into it."""
+        slot = frame % self.slots
+        with self._cond:
+            self._cond.wait_for(lambda: self._slot_frames[slot] == frame)
+
+        surface_to_bgr(surface, self._view(slot))
+        with self._cond:
+            self._ready[slot] = 1
+            self._cond.notify_all()
+
+    def frames(self, frames: int, alive: Callable[[], bool]) -> Iterator[np.ndarray]:
+        """
+        Yields frames 0 to frames-1 in order as they are finished.
+        Each frame is a view into the ring, valid until the next one is requested.
+        :param frames: Number of frames.
+        :param alive: Returns whether the workers can still finish frames, checked while waiting.
+            Should be False once any worker failed, as the frames it took are never put.
+        """
+        for frame in range(frames):
+            slot = frame % self.slots
+            with self._cond:
+                while not self._cond.wait_for(lambda: self._ready[slot], timeout=1):
+                    if not alive() and not self._ready[slot]:
+                        raise RuntimeError(f"Render workers stopped before finishing frame {frame}.")
+
+            view = self._view(slot)
+            yield view
+            del view
+
+            with self._cond:
+                self._ready[slot] = 0
+                self._slot_frames[slot] += self.slots
+                self._cond.notify_all()
+
+    def close(self) -> None:
+        """Frees the shared memory."""
+        try:
+            self._shm.close()
+        except BufferError:
+            # A frame view is still referenced after an interrupt, the mapping goes with the process.
+            pass
+        self._shm.unlink()
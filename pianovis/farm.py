@@ -0,0 +1,188 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import os
+import json
+import socket
+import time
+import pygame
+import numpy as np
+from typing import Dict, List, Optional
+from .encode import FFmpegWriter, concat_segments
+from .notes import NoteStore
+from .utils import ProgressLine, init_console, print_process
+from .video import Video
+
+MANIFEST_VERSION = 1
+
+
+def plan(video: Video, path: str, directory: str, chunk_frames: Optional[int] = None) -> str:
+    """
+    Plans a distributed export of video into a job directory, and returns the manifest path.
+    Midis are parsed once here, and the notes saved next to the manifest, so chunk workers
+    only render. Chunks are rendered by "pianovis render" and joined by "pianovis merge".
+    :param video: Video with midis, audio and options set.
+    :param path: Path of the final video, must be .mp4
+    :param directory: Job directory, shared by every worker. Created if missing.
+    :param chunk_frames: Frames per chunk, same as export segments if None.
+    """
+    if not path.endswith(".mp4"):
+        raise ValueError("Path must end with .mp4")
+    chunk_frames = video._segment_frames if chunk_frames is None else chunk_frames
+    if chunk_frames < 1:
+        raise ValueError("chunk_frames must be positive")
+    os.makedirs(os.path.join(directory, "chunks"), exist_ok=True)
+
+    video._prep_render()
+    np.save(os.path.join(directory, "notes.npy"), video._notes.notes)
+    decor = None
+    if video._decor_surf is not None:
+        decor = "decor.png"
+        pygame.image.save(video._decor_surf, os.path.join(directory, decor))
+
+    frames = video._calc_num_frames()
+    bounds = list(range(0, frames, chunk_frames)) + [frames]
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "output": os.path.realpath(path),
+        "audio": None if video._audio_path is None else os.path.realpath(video._audio_path),
+        "resolution": list(video._res),
+        "fps": video._fps,
+        "offset": video._offset,
+        "options": video._options,
+        "notes": "notes.npy",
+        "decor": decor,
+        "frames": frames,
+        "chunks": [{"start": bounds[i], "end": bounds[i+1], "path": os.path.join("chunks", f"{bounds[i]}.mp4")}
+            for i in range(len(bounds)-1)],
+    }
+    manifest_path = os.path.join(directory, "manifest.json")
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=4)
+    print(f"Planned {frames} frames in {len(manifest['chunks'])} chunks: {manifest_path}")
+    return manifest_path
+
+
+def load_manifest(path: str) -> Dict:
+    """Returns manifest at path, with chunk and file paths made absolute."""
+    with open(path) as file:
+        manifest = json.load(file)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version {manifest.get('version')}, expected {MANIFEST_VERSION}")
+
+    directory = os.path.dirname(os.path.realpath(path))
+    for chunk in manifest["chunks"]:
+        chunk["path"] = os.path.join(directory, chunk["path"])
+    manifest["notes"] = os.path.join(directory, manifest["notes"])
+    if manifest["decor"] is not None:
+        manifest["decor"] = os.path.join(directory, manifest["decor"])
+    return manifest
+
+
+def load_video(manifest: Dict) -> Video:
+    """Returns a video set up from a loaded manifest, ready to render."""
+    decor = None if manifest["decor"] is None else pygame.image.load(manifest["decor"])
+    video = Video(tuple(manifest["resolution"]), manifest["fps"], manifest["offset"], decor)
+    for path, value in manifest["options"].items():
+        video.configure(path, value)
+    video._notes = NoteStore(np.load(manifest["notes"]))
+    video._build_index()
+    return video
+
+
+def chunk_status(manifest: Dict) -> List[str]:
+    """Returns status of each chunk: "done", "claimed" (being rendered, or its worker died) or "todo"."""
+    status = []
+    for chunk in manifest["chunks"]:
+        if os.path.isfile(chunk["path"]):
+            status.append("done")
+        elif os.path.isfile(chunk["path"] + ".lock"):
+            status.append("claimed")
+        else:
+            status.append("todo")
+    return status
+
+
+def _claim(chunk):
+    """Claims chunk with a lock file next to its segment, returns whether this process got it."""
+    try:
+        fd = os.open(chunk["path"] + ".lock", os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as file:
+        file.write(f"{socket.gethostname()} {os.getpid()} {time.time()}\n")
+    return True
+
+
+def render_chunk(video: Video, chunk: Dict) -> None:
+    """Renders chunk into its segment. The segment appears under its final name only once complete."""
+    progress = ProgressLine(chunk["end"] - chunk["start"])
+    for i, frame in enumerate(video._render_segment(chunk["path"], chunk["start"], chunk["end"])):
+        progress.update(f"Rendering frame {frame} of chunk {chunk['start']}-{chunk['end']}", i+1)
+    progress.clear()
+
+
+def render(manifest_path: str, chunks: Optional[List[int]] = None) -> int:
+    """
+    Renders chunks of a manifest, and returns the number rendered.
+    :param manifest_path: Manifest written by plan.
+    :param chunks: Indices of chunks to render, even if done or claimed. If None, claims and
+        renders unclaimed chunks until none are left, so any number of workers can share a job.
+    """
+    if not FFmpegWriter.available():
+        raise RuntimeError("ffmpeg not found, it is needed to render chunks.")
+    init_console()
+    manifest = load_manifest(manifest_path)
+    num_chunks = len(manifest["chunks"])
+    bad = [x for x in chunks or [] if not 0 <= x < num_chunks]
+    if bad:
+        raise ValueError(f"No chunks {', '.join(map(str, bad))}, the manifest has chunks 0 to {num_chunks-1}.")
+    video = load_video(manifest)
+
+    rendered = 0
+    todo = range(num_chunks) if chunks is None else chunks
+    for index in todo:
+        chunk = manifest["chunks"][index]
+        if chunks is None:
+            if os.path.isfile(chunk["path"]) or not _claim(chunk):
+                continue
+            # Another worker may have finished the chunk and released its lock since the check above.
+            if os.path.isfile(chunk["path"]):
+                os.remove(chunk["path"] + ".lock")
+                continue
+        try:
+            start = time.time()
+            render_chunk(video, chunk)
+            print_process.finish(f"Rendered chunk {index} (frames {chunk['start']}-{chunk['end']}) "
+                f"in {time.time()-start:.1f}s.")
+            rendered += 1
+        finally:
+            if chunks is None:
+                os.remove(chunk["path"] + ".lock")
+    return rendered
+
+
+def merge(manifest_path: str) -> None:
+    """Joins the rendered chunks of a manifest into its output video, muxing the audio."""
+    manifest = load_manifest(manifest_path)
+    missing = [i for i, x in enumerate(chunk_status(manifest)) if x != "done"]
+    if missing:
+        raise RuntimeError(f"{len(missing)} of {len(manifest['chunks'])} chunks are not rendered: "
+            + ", ".join(map(str, missing)))
+    init_console()
+    concat_segments([x["path"] for x in manifest["chunks"]], manifest["output"], manifest["audio"])
+    print_process.finish(f"Merged {len(manifest['chunks'])} chunks into {manifest['output']}.")
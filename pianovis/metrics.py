@@ -0,0 +1,97 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import json
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+# Upper edges (milliseconds) of histogram buckets, the last bucket is everything above.
+HISTOGRAM_EDGES = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+STAGES = ("parse", "index", "blocks", "piano", "transfer", "encode", "mux")
+
+
+class ExportMetrics:
+    """
+    Timings of export stages. Per-frame stages (blocks, piano, transfer, encode) get one sample per
+    frame, and one-off stages (parse, index, mux) one sample per run.
+    Samples are in seconds. Workers of a multi core export send theirs back to be merged.
+    """
+
+    def __init__(self, frames_total: int = 0) -> None:
+        self.samples: Dict[str, List[float]] = {}
+        self.frames_total = frames_total
+        self.frames_done = 0
+        self.start = time.time()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Times the body as one sample of stage name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.samples.setdefault(name, []).append(seconds)
+
+    def merge(self, samples: Dict[str, List[float]]) -> None:
+        """Adds samples of another process."""
+        for name, values in samples.items():
+            self.samples.setdefault(name, []).extend(values)
+
+    def histogram(self, name: str) -> List[int]:
+        """Returns counts of samples of name in each bucket of HISTOGRAM_EDGES, plus one above the last."""
+        counts = [0] * (len(HISTOGRAM_EDGES)+1)
+        for value in self.samples.get(name, ()):
+            counts[bisect_right(HISTOGRAM_EDGES, value*1000)] += 1
+        return counts
+
+    def summary(self, name: str) -> Dict[str, float]:
+        """Returns count, total and mean, median, 90th, 99th percentile and max (milliseconds) of stage name."""
+        values = sorted(self.samples.get(name, ()))
+        if not values:
+            return {"count": 0, "total": 0.0}
+        percentile = lambda fac: values[min(int(fac*len(values)), len(values)-1)] * 1000
+        return {
+            "count": len(values),
+            "total": sum(values),
+            "mean": sum(values) / len(values) * 1000,
+            "p50": percentile(0.5),
+            "p90": percentile(0.9),
+            "p99": percentile(0.99),
+            "max": values[-1] * 1000,
+        }
+
+    def report(self) -> Dict:
+        """Returns summary and histogram of every stage, in stage order, as a JSON serializable dict."""
+        names = [x for x in STAGES if x in self.samples] + sorted(set(self.samples) - set(STAGES))
+        elapse = time.time() - self.start
+        return {
+            "frames": self.frames_done,
+            "elapse": elapse,
+            "fps": self.frames_done / elapse if elapse > 0 else 0.0,
+            "histogram_edges_ms": list(HISTOGRAM_EDGES),
+            "stages": {x: dict(self.summary(x), histogram=self.histogram(x)) for x in names},
+        }
+
+    def save(self, path: str) -> None:
+        """Writes report to path as JSON."""
+        with open(path, "w") as file:
+            json.dump(self.report(), file, indent=4)
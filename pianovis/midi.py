@@ -0,0 +1,292 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import os
+import numpy as np
+import mido
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from typing import List, Optional
+
+# Bump when parsing output changes, so cached notes are parsed again.
+PARSER_VERSION = 2
+
+
+def _read_var_len(data, i):
+    value = 0
+    while True:
+        byte = data[i]
+        i += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, i
+
+
+def _read_events(path):
+    """
+    Reads absolute ticks of tempo and note events of every track straight from the file bytes,
+    skipping all other events. Much faster than building mido messages for huge files.
+    Returns ticks per beat, (ticks, tempos, tracks) and (ticks, keys, note ons, tracks).
+    Raises ValueError or IndexError if the file is not a plain standard midi file.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if data[:4] != b"MThd":
+        raise ValueError("Not a standard midi file.")
+    header_len = int.from_bytes(data[4:8], "big")
+    tpb = int.from_bytes(data[12:14], "big")
+    if tpb & 0x8000:
+        raise ValueError("SMPTE time division is not supported.")
+
+    tempo_events = ([], [], [])
+    note_events = ([], [], [], [])
+    tempo_ticks, tempos, tempo_tracks = tempo_events
+    note_ticks, note_keys, note_ons, note_tracks = note_events
+
+    pos = 8 + header_len
+    track_ind = 0
+    while pos + 8 <= len(data):
+        chunk_len = int.from_bytes(data[pos+4:pos+8], "big")
+        i, end = pos + 8, pos + 8 + chunk_len
+        is_track = data[pos:pos+4] == b"MTrk"
+        pos = end
+        if not is_track:
+            continue
+
+        tick = 0
+        status = None
+        while i < end:
+            delta, i = _read_var_len(data, i)
+            tick += delta
+            byte = data[i]
+
+            if byte == 0xFF:
+                meta_type = data[i+1]
+                length, i = _read_var_len(data, i+2)
+                if meta_type == 0x51:
+                    tempo_ticks.append(tick)
+                    tempos.append(int.from_bytes(data[i:i+3], "big"))
+                    tempo_tracks.append(track_ind)
+                i += length
+            elif byte == 0xF0 or byte == 0xF7:
+                length, i = _read_var_len(data, i+1)
+                i += length
+            else:
+                if byte & 0x80:
+                    status = byte
+                    i += 1
+                elif status is None:
+                    raise ValueError("Running status without a previous status.")
+
+                kind = status & 0xF0
+                if kind == 0xC0 or kind == 0xD0:
+                    i += 1
+                elif kind == 0xF0:
+                    raise ValueError("Unsupported system message in track.")
+                else:
+                    if kind == 0x90 or kind == 0x80:
+                        note_ticks.append(tick)
+                        note_keys.append(data[i]-21)
+                        note_ons.append(kind == 0x90 and data[i+1] > 0)
+                        note_tracks.append(track_ind)
+                    i += 2
+
+        track_ind += 1
+
+    return tpb, tempo_events, note_events
+
+
+def _read_events_mido(path):
+    """Same as _read_events, reading the file with mido."""
+    midi = mido.MidiFile(path)
+    tempo_events = ([], [], [])
+    note_events = ([], [], [], [])
+    tempo_ticks, tempos, tempo_tracks = tempo_events
+    note_ticks, note_keys, note_ons, note_tracks = note_events
+
+    for track_ind, track in enumerate(midi.tracks):
+        tick = 0
+        for msg in track:
+            tick += msg.time
+            msg_type = msg.type
+            if msg_type == "note_on" or msg_type == "note_off":
+                note_ticks.append(tick)
+                note_keys.append(msg.note-21)
+                note_ons.append(msg_type == "note_on" and msg.velocity > 0)
+                note_tracks.append(track_ind)
+            elif msg_type == "set_tempo":
+                tempo_ticks.append(tick)
+                tempos.append(msg.tempo)
+                tempo_tracks.append(track_ind)
+
+    return midi.ticks_per_beat, tempo_events, note_events
+
+
+def parse_midi(path: str, fps: float, offset: float) -> np.ndarray:
+    """
+    Parses a midi into an (n, 3) float array of (key, start, end) rows, in frames.
+    Events of all tracks are merged. Ticks are converted to frames in bulk with a cumulative
+    tempo map, and note offs are paired with the latest note on of the same key.
+    Notes are in order of their note off, and keys outside the piano are skipped.
+    :param path: Midi file path.
+    :param fps: Frames per second of video.
+    :param offset: Offset (frames) in start time of playing.
+    """
+    try:
+        tpb, tempo_events, note_events = _read_events(path)
+    except (ValueError, IndexError):
+        tpb, tempo_events, note_events = _read_events_mido(path)
+    tempo_ticks, tempos, tempo_tracks = tempo_events
+    note_ticks, note_keys, note_ons, note_tracks = note_events
+
+    if not note_ticks:
+        return np.zeros((0, 3), dtype=np.float64)
+
+    # Tempo map: seconds elapsed at each tempo change, the last change on a tick wins.
+    order = np.lexsort((np.arange(len(tempo_ticks)), tempo_tracks, tempo_ticks))
+    tempo_ticks = np.concatenate(([0], np.array(tempo_ticks, dtype=np.int64)[order]))
+    tempos = np.concatenate(([500000], np.array(tempos, dtype=np.float64)[order]))
+    sec_per_tick = tempos / tpb / 1000000
+    tempo_secs = np.concatenate(([0], np.cumsum(np.diff(tempo_ticks) * sec_per_tick[:-1])))
+
+    # Merge tracks: sort by tick, then track, then position in track.
+    note_ticks = np.array(note_ticks, dtype=np.int64)
+    order = np.lexsort((np.arange(len(note_ticks)), note_tracks, note_ticks))
+    ticks = note_ticks[order]
+    keys = np.array(note_keys, dtype=np.int64)[order]
+    ons = np.array(note_ons, dtype=bool)[order]
+
+    seg = np.searchsorted(tempo_ticks, ticks, side="right") - 1
+    frames = offset + (tempo_secs[seg] + (ticks-tempo_ticks[seg]) * sec_per_tick[seg]) * fps
+
+    on_piano = (keys >= 0) & (keys < 88)
+    keys, ons, frames = keys[on_piano], ons[on_piano], frames[on_piano]
+
+    # Group by key keeping stream order, then find the latest note on before each event.
+    by_key = np.argsort(keys, kind="stable")
+    keys, ons, frames = keys[by_key], ons[by_key], frames[by_key]
+    pos = np.arange(len(keys))
+    last_on = np.maximum.accumulate(np.where(ons, pos, -1))
+    paired = ~ons & (last_on >= 0)
+    paired[paired] &= keys[last_on[paired]] == keys[paired]
+
+    offs = pos[paired]
+    offs = offs[np.argsort(by_key[offs], kind="stable")]
+    notes = np.empty((len(offs), 3), dtype=np.float64)
+    notes[:, 0] = keys[offs]
+    notes[:, 1] = frames[last_on[offs]]
+    notes[:, 2] = frames[offs]
+    return notes
+
+
+class MidiCache:
+    """
+    On disk cache of parsed midis, stored as .npy files keyed by file contents, fps and offset.
+    The least recently used entries are removed once the cache grows past max_size bytes.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_size: int = 256*1024*1024) -> None:
+        """
+        Initializes cache.
+        :param directory: Cache directory, defaults to pianovis/midi in the user cache directory.
+        :param max_size: Maximum total size (bytes) of cached files.
+        """
+        if directory is None:
+            base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+            directory = os.path.join(base, "pianovis", "midi")
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, path: str, fps: float, offset: float) -> str:
+        """Returns the cache key of a midi."""
+        key = sha256()
+        with open(path, "rb") as file:
+            key.update(file.read())
+        key.update(repr((PARSER_VERSION, fps, offset)).encode())
+        return key.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key+".npy")
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Returns cached notes of key, or None if not cached."""
+        path = self._path(key)
+        try:
+            notes = np.load(path)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return notes
+
+    def put(self, key: str, notes: np.ndarray) -> None:
+        """Stores notes under key, then evicts old entries if the cache is too large."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._path(key) + f".{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.save(file, notes)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes least recently used entries until the cache fits in max_size."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(x[1] for x in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+    def parse(self, paths: List[str], fps: float, offset: float, max_workers: Optional[int] = None) -> List[np.ndarray]:
+        """
+        Returns parsed notes of each midi, reading cached entries and parsing the rest in parallel.
+        :param paths: Midi file paths.
+        :param fps: Frames per second of video.
+        :param offset: Offset (frames) in start time of playing.
+        :param max_workers: Maximum processes used to parse, defaults to the cpu count.
+        """
+        keys = [self.key(path, fps, offset) for path in paths]
+        results = [self.get(key) for key in keys]
+        missing = [i for i, notes in enumerate(results) if notes is None]
+
+        max_workers = min(len(missing), max_workers or os.cpu_count() or 1)
+        if max_workers <= 1:
+            for i in missing:
+                results[i] = parse_midi(paths[i], fps, offset)
+        else:
+            with ProcessPoolExecutor(max_workers) as executor:
+                futures = [executor.submit(parse_midi, paths[i], fps, offset) for i in missing]
+                for i, future in zip(missing, futures):
+                    results[i] = future.result()
+
+        for i in missing:
+            try:
+                self.put(keys[i], results[i])
+            except OSError:
+                pass
+        return results
@@ -0,0 +1,222 @@
+#  ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import numpy as np
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+NOTE_DTYPE = np.dtype([
+    ("key", np.uint8),
+    ("start", np.float64),
+    ("end", np.float64),
+    ("midi", np.uint16),
+    ("color", np.uint8),
+])
+
+
+class NoteStore:
+    """
+    Columnar store of notes, backed by a structured array of NOTE_DTYPE.
+    Times are in frames, midi is the index of the source midi, and color is the index
+    into the color table. Slicing and indexing with arrays returns a store sharing or
+    copying rows, so views are cheap to pass around.
+    """
+
+    def __init__(self, notes: Optional[np.ndarray] = None) -> None:
+        """
+        Initializes store.
+        :param notes: Structured array of NOTE_DTYPE, empty if None.
+        """
+        self.notes = np.zeros(0, dtype=NOTE_DTYPE) if notes is None else notes
+        self._orders = {}
+
+    @classmethod
+    def from_midis(cls, midis: Sequence[np.ndarray]) -> "NoteStore":
+        """Builds a store from (n, 3) float arrays of (key, start, end) rows, one per midi."""
+        notes = np.zeros(sum(len(x) for x in midis), dtype=NOTE_DTYPE)
+        pos = 0
+        for i, midi in enumerate(midis):
+            rows = notes[pos:pos+len(midi)]
+            rows["key"] = midi[:, 0]
+            rows["start"] = midi[:, 1]
+            rows["end"] = midi[:, 2]
+            rows["midi"] = i
+            pos += len(midi)
+
+        notes["color"] = notes["key"]
+        return cls(notes)
+
+    def __len__(self) -> int:
+        return len(self.notes)
+
+    def __getitem__(self, index) -> "NoteStore":
+        return NoteStore(self.notes[index])
+
+    @property
+    def keys(self) -> np.ndarray:
+        return self.notes["key"]
+
+    @property
+    def starts(self) -> np.ndarray:
+        return self.notes["start"]
+
+    @property
+    def ends(self) -> np.ndarray:
+        return self.notes["end"]
+
+    @property
+    def midis(self) -> np.ndarray:
+        return self.notes["midi"]
+
+    @property
+    def colors(self) -> np.ndarray:
+        return self.notes["color"]
+
+    def order(self, field: str) -> np.ndarray:
+        """Returns indices that stably sort notes by field, computed once per field."""
+        if field not in self._orders:
+            self._orders[field] = np.argsort(self.notes[field], kind="stable")
+        return self._orders[field]
+
+    def sorted_by(self, field: str) -> "NoteStore":
+        """Returns a store of the notes sorted by field."""
+        return self[self.order(field)]
+
+    def max_end(self) -> float:
+        """Returns the latest end frame."""
+        return float(self.ends.max())
+
+
+class IntervalNode:
+    """Node of a centered interval tree over (low, high, index) intervals."""
+
+    def __init__(self, intervals: List[Tuple[float, float, int]]) -> None:
+        points = sorted(x for low, high, _ in intervals for x in (low, high))
+        self.center = points[len(points)//2]
+
+        left, right, here = [], [], []
+        for interval in intervals:
+            if interval[1] < self.center:
+                left.append(interval)
+            elif interval[0] > self.center:
+                right.append(interval)
+            else:
+                here.append(interval)
+
+        self.by_low = sorted(here, key=(lambda x: x[0]))
+        self.by_high = sorted(here, key=(lambda x: x[1]), reverse=True)
+        self.left = IntervalNode(left) if left else None
+        self.right = IntervalNode(right) if right else None
+
+    def query(self, point: float, result: List[int]) -> None:
+        """Appends index of every interval containing point to result."""
+        node = self
+        while node is not None:
+            if point < node.center:
+                for low, high, index in node.by_low:
+                    if low > point:
+                        break
+                    result.append(index)
+                node = node.left
+            elif point > node.center:
+                for low, high, index in node.by_high:
+                    if high < point:
+                        break
+                    result.append(index)
+                node = node.right
+            else:
+                result.extend(x[2] for x in node.by_low)
+                break
+
+
+class NoteIndex:
+    """
+    Index of notes for fast per-frame lookup.
+    A note is active on a frame if start - lookahead <= frame <= end, which covers every
+    note whose block is above the keyboard. Sequential frames are answered by a sweep line
+    over enter and exit events, and seeks by an interval tree in O(log n + k).
+    Counts of played, playing and upcoming notes are answered in O(log n) from sorted starts and ends.
+    """
+
+    def __init__(self, notes: NoteStore, lookahead: float) -> None:
+        """
+        Initializes index.
+        :param notes: Notes to index.
+        :param lookahead: Frames before its start that a note becomes active.
+        """
+        self.notes = notes
+        self.lookahead = lookahead
+
+        lows = notes.starts - lookahead
+        highs = notes.ends
+        intervals = list(zip(lows.tolist(), highs.tolist(), range(len(notes))))
+        self._tree = IntervalNode(intervals) if intervals else None
+
+        enter = np.argsort(lows, kind="stable")
+        self._enter = enter.tolist()
+        self._enter_keys = lows[enter].tolist()
+        exits = np.argsort(highs, kind="stable")
+        self._exit = exits.tolist()
+        self._exit_keys = highs[exits].tolist()
+        self._start_keys = np.sort(notes.starts).tolist()
+
+        self._active = set()
+        self._enter_pos = 0
+        self._exit_pos = 0
+        self._frame = None
+
+    def query(self, frame: float) -> List[int]:
+        """Returns indices (in note order) of notes active on frame."""
+        result = []
+        if self._tree is not None:
+            self._tree.query(frame, result)
+        return sorted(result)
+
+    def active(self, frame: float) -> List[int]:
+        """
+        Returns indices (in note order) of notes active on frame.
+        Consecutive frames advance the sweep line, any other frame reseeds it from the tree.
+        """
+        if self._frame is None or not 0 <= frame - self._frame <= 1:
+            self._active = set(self.query(frame))
+            self._enter_pos = bisect_right(self._enter_keys, frame)
+            self._exit_pos = bisect_left(self._exit_keys, frame)
+        else:
+            while self._enter_pos < len(self._enter) and self._enter_keys[self._enter_pos] <= frame:
+                self._active.add(self._enter[self._enter_pos])
+                self._enter_pos += 1
+            while self._exit_pos < len(self._exit) and self._exit_keys[self._exit_pos] < frame:
+                self._active.discard(self._exit[self._exit_pos])
+                self._exit_pos += 1
+
+        self._frame = frame
+        return sorted(self._active)
+
+    def counts(self, frame: float) -> Dict[str, int]:
+        """
+        Returns numbers of notes started (played), sounding (playing) and not yet started (to_play) on frame.
+        A note is sounding if start <= frame <= end.
+        """
+        played = bisect_right(self._start_keys, frame)
+        ended = bisect_left(self._exit_keys, frame)
+        return {"played": played, "playing": played-ended, "to_play": len(self._start_keys)-played}
+
+    def playing(self, frame: float) -> List[int]:
+        """Returns sorted keys of notes sounding on frame."""
+        active = self.notes[self.active(frame)]
+        sounding = (active.starts <= frame) & (frame <= active.ends)
+        return np.unique(active.keys[sounding]).tolist()
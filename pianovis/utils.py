@@ -17,13 +17,25 @@
 
 import sys
 import time
+import queue
+import threading
 import colorama
 from colorama import Fore
-colorama.init()
+
+_console_ready = False
+
+
+def init_console():
+    """Sets up colored console output on first call, instead of wrapping stdout on import."""
+    global _console_ready
+    if not _console_ready:
+        colorama.init()
+        _console_ready = True
 
 
 class PrintProcess:
     def write(self, msg):
+        init_console()
         sys.stdout.write(msg)
         sys.stdout.flush()
 
@@ -33,9 +45,48 @@ class PrintProcess:
         sys.stdout.write("\r")
 
     def finish(self, msg):
+        init_console()
         print(Fore.GREEN + msg + Fore.WHITE)
 
 
+def format_progress(msg, done, total, elapse):
+    """Returns msg with remaining time and a progress bar, given done of total items after elapse seconds."""
+    left = (total-done) * elapse / max(done, 1)
+    percent = done / total
+    progress = int(percent * 50)
+    progress_msg = "[{}{}] {}%".format("#"*progress, "-"*(50-progress), int(percent*100))
+    return "{}    Remaining: {}    {}".format(msg, str(left)[:6], progress_msg)
+
+
+class ProgressLine:
+    """
+    Progress message with remaining time, rewritten in place at most once per interval seconds,
+    so per-frame loops do not pay for console output every frame.
+    """
+
+    def __init__(self, total, interval=0.25):
+        self.total = total
+        self.interval = interval
+        self.start = time.time()
+        self.msg = ""
+        self._next = 0
+
+    def update(self, msg, done):
+        """Shows msg with done of total items, returns whether it was shown."""
+        now = time.time()
+        if now < self._next and done < self.total:
+            return False
+        self._next = now + self.interval
+        print_process.clear(self.msg)
+        self.msg = format_progress(msg, done, self.total, now-self.start)
+        print_process.write(self.msg)
+        return True
+
+    def clear(self):
+        print_process.clear(self.msg)
+        self.msg = ""
+
+
 class PreciseClock:
     def __init__(self, fps):
         self.pause_time = 1 / fps
@@ -47,4 +98,119 @@ class PreciseClock:
         self.next_tick += self.pause_time
 
 
+class FramePrefetcher:
+    """
+    Renders upcoming frames in a background thread into a bounded queue, for a display loop
+    that only shows them. Frames the display has already passed are skipped, not rendered.
+    """
+
+    def __init__(self, render, frame, end, depth):
+        """
+        :param render: Function taking a frame and returning its result. It must not return a pooled
+            surface, as the next render would overwrite it before it is shown.
+        :param frame: First frame to render.
+        :param end: Frame to stop before.
+        :param depth: Maximum frames rendered ahead, at least 1.
+        """
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        self.render = render
+        self.end = end
+        self.depth = depth
+        self.dropped = 0
+        self._queue = queue.Queue(depth)
+        self._lock = threading.Lock()
+        self._seeked = threading.Condition(self._lock)
+        self._generation = 0
+        self._next = frame
+        self._wanted = frame
+        self._stopped = False
+        self._error = None
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def seek(self, frame):
+        """Drops rendered frames and restarts rendering from frame."""
+        with self._lock:
+            self._generation += 1
+            self._next = self._wanted = frame
+            self._seeked.notify()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def get(self, frame, wait=False):
+        """
+        Returns result of frame. If it is not rendered yet, it counts as dropped, and the result of the
+        latest rendered frame before it is returned instead, or None if there is none.
+        Once frames rendered before it are taken, an exception raised by render is raised here.
+        :param wait: Wait until frame is rendered instead.
+        """
+        if frame >= self.end:
+            return None
+        with self._lock:
+            self._wanted = frame
+            if frame < self._next - self._queue.qsize() - 1:
+                # Jumped back past the rendered frames.
+                self._generation += 1
+                self._next = frame
+                self._seeked.notify()
+            generation = self._generation
+
+        latest = None
+        while True:
+            try:
+                item_gen, item_frame, result = self._queue.get(wait, 0.1)
+            except queue.Empty:
+                if self._error is not None:
+                    raise self._error
+                if wait and not self._stopped and self._thread.is_alive():
+                    continue
+                self.dropped += 1
+                return latest
+            if item_gen != generation:
+                continue
+            if item_frame < frame:
+                latest = result
+            elif item_frame == frame:
+                return result
+            else:
+                self.seek(frame)
+                return self.get(frame, wait)
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            self._seeked.notify()
+
+    def _produce(self):
+        while True:
+            with self._lock:
+                while not self._stopped and max(self._next, self._wanted) >= self.end:
+                    self._seeked.wait()
+                if self._stopped:
+                    return
+                frame = self._next = max(self._next, self._wanted)
+                self._next += 1
+                generation = self._generation
+
+            try:
+                result = self.render(frame)
+            except Exception as e:
+                # Nothing renders after this, the display gets the error from get.
+                self._error = e
+                return
+            while not self._stopped and generation == self._generation:
+                try:
+                    self._queue.put((generation, frame, result), timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+
 print_process = PrintProcess()
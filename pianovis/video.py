@@ -23,22 +23,49 @@ import threading
 import multiprocessing
 import pygame
 import cv2
-import mido
+import cProfile
 import colorsys
-import colorama
-from typing import Any, Tuple
+import numpy as np
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from fractions import Fraction
+from typing import Any, Callable, Dict, Optional, Tuple
 from hashlib import sha256
+from queue import Empty
 from colorama import Fore
 from .constants import *
-from .utils import PreciseClock, print_process
-pygame.init()
-colorama.init()
+from .encode import FFmpegWriter, FrameRing, concat_segments, surface_to_bgr
+from .metrics import ExportMetrics
+from .midi import MidiCache, parse_midi
+from .notes import NoteIndex, NoteStore
+from .utils import FramePrefetcher, PreciseClock, ProgressLine, init_console, print_process
+
+# Bump when rendered frames change, so segments of interrupted exports are rendered again.
+RENDER_VERSION = 1
 
 
 class Video:
     """Video class that contains midis and export."""
     _key_subdivs = 50
     _block_glow_height = 20
+    _ring_slots_per_core = 2
+    _segment_frames = 300
+    _strip_tile_height = 512
+    _strip_max_tiles = 16
+    _strip_max_phases = 4
+    _no_stage = nullcontext()
+    _key_table_options = ("keys.black.width_fac",)
+    _color_table_options = ("blocks.color_grad", "blocks.color_hue", "blocks.color_saturation", "blocks.color_value")
+    _key_sprite_options = ("keys.white.gap", "keys.white.color", "keys.black.height_fac", "keys.black.color")
+    _strip_options = ("blocks.border", "blocks.color_border", "blocks.rounding", "blocks.motion_blur")
+    # Options in pixels, with the axis they scale along when rendering at another resolution.
+    _pixel_options = {"keys.white.gap": "x", "blocks.speed": "y", "blocks.border": "xy", "blocks.rounding": "xy"}
+    # Quality tiers, cheapest first: resolution scale, key gradient steps and options turned off.
+    _quality_tiers = {
+        "draft": (0.5, 8, {"blocks.motion_blur": False, "blocks.rounding": 0, "blocks.border": 0, "blocks.light": False}),
+        "preview": (0.75, 20, {"blocks.motion_blur": False}),
+        "final": (1, 50, {}),
+    }
 
     def __init__(self, resolution: Tuple[int, int], fps: int, offset: int, decor_surf: pygame.Surface = None) -> None:
         """
@@ -54,8 +81,22 @@ class Video:
         self._decor_surf = decor_surf
         self._midi_paths = []
         self._audio_path = None
-        self._notes = []
+        self._notes = NoteStore()
+        self._midi_cache = MidiCache()
+        self._key_sprites = {}
+        self._key_sprite_hits = 0
+        self._key_sprite_misses = 0
+        self._strip_tiles = OrderedDict()
+        self._layers = {}
+        self._frame_bgr = None
+        self._layer_allocs = 0
+        self._layer_reuses = 0
+        self._tier_videos = {}
+        self._metrics = None
+        self._options_version = 0
+        self._reset_piano()
         self._gen_info()
+        self._build_index()
 
     def _gen_info(self):
         width, height = self._res
@@ -80,17 +121,44 @@ class Video:
             "blocks.rounding": 5,
             "blocks.motion_blur": True,
             "blocks.light": False,
+            "blocks.strip": False,
+            "export.codec": "libx264",
+            "export.preset": "medium",
+            "export.crf": 18,
         }
 
         # Key positions
         self._key_width = key_width
         self._key_height = height / 4
         self._key_y_loc = y_offset
-        self._key_locs = []
-        for key in range(88):
-            self._key_locs.append([key, self._is_white(key), self._find_x_loc(key)])
+        self._gen_key_tables()
+        self._gen_color_table()
+
+    def _gen_key_tables(self):
+        white_width = self._res[0] * 0.95 / 52
+        black_width = white_width * self._options["keys.black.width_fac"]
+
+        self._key_white = [self._is_white(key) for key in range(88)]
+        self._key_x = [self._find_x_loc(key) for key in range(88)]
+        self._key_block_width = [white_width if white else black_width for white in self._key_white]
+        self._block_x = np.array(self._key_x)
+        self._block_widths = np.array(self._key_block_width) - 1
 
+        self._key_locs = [[key, self._key_white[key], self._key_x[key]] for key in range(88)]
         self._key_locs = sorted(self._key_locs, key=(lambda x: 0 if x[1] else 1))
+        self._reset_piano()
+        self._strip_tiles.clear()
+
+    def _gen_color_table(self):
+        self._key_colors = [tuple(self._get_color(key)) for key in range(88)]
+        self._key_colors_blur = [(*color, 92) for color in self._key_colors]
+
+        # Glow color of each key on each row above the keyboard, row i is i pixels up.
+        glow = [[self._color_mix((255, 255, 255), color, i/self._block_glow_height)
+            for i in range(self._block_glow_height)] for color in self._key_colors]
+        self._glow_colors = np.array(glow).astype(np.uint8)
+        self._reset_piano()
+        self._strip_tiles.clear()
 
     def _is_white(self, key):
         return (key-3) % 12 not in (1, 3, 6, 8, 10)
@@ -112,7 +180,40 @@ class Video:
         return loc
 
     def configure(self, path: str, value: Any) -> None:
+        changed = self._options.get(path) != value
         self._options[path] = value
+        if not changed:
+            return
+        self._options_version += 1
+
+        if path in self._key_table_options:
+            self._gen_key_tables()
+        if path in self._color_table_options:
+            self._gen_color_table()
+        if path in self._key_sprite_options:
+            self._reset_piano()
+        if path in self._strip_options:
+            self._strip_tiles.clear()
+        if path == "blocks.speed":
+            self._build_index()
+
+    def sprite_cache_info(self) -> Dict[str, int]:
+        """Returns hits, misses and size of the pressed key sprite cache."""
+        return {"hits": self._key_sprite_hits, "misses": self._key_sprite_misses, "size": len(self._key_sprites)}
+
+    def layer_pool_info(self) -> Dict[str, int]:
+        """Returns allocations, reuses, number and total bytes of the pooled layer surfaces and frame array."""
+        size = sum(x.get_bytesize() * x.get_width() * x.get_height() for x in self._layers.values())
+        if self._frame_bgr is not None:
+            size += self._frame_bgr.nbytes
+        return {"allocations": self._layer_allocs, "reuses": self._layer_reuses, "layers": len(self._layers), "bytes": size}
+
+    def note_stats(self, frame: int) -> Dict[str, int]:
+        """
+        Returns numbers of notes played, playing and to play on frame, in O(log n).
+        Reflects the notes parsed by the last preview, export or app load.
+        """
+        return self._index.counts(frame)
 
     def add_midi(self, path: str) -> None:
         """Adds midi path to list."""
@@ -165,130 +266,499 @@ class Video:
         return convert(color)
 
     def _parse_midis(self):
-        self._notes = []
         num_midis = len(self._midi_paths)
+        print_msg = f"Parsing {num_midis} midis"
+        print_process.write(print_msg)
 
-        for i, path in enumerate(self._midi_paths):
-            print_msg = f"Parsing midi {i+1} of {num_midis}"
-            print_process.write(print_msg)
-            midi = mido.MidiFile(path)
-            tpb = midi.ticks_per_beat
-
-            starts = [None for i in range(88)]
-            tempo = 500000
-            curr_frame = self._offset
-            for msg in midi.tracks[0]:
-                curr_frame += msg.time / tpb * tempo / 1000000 * self._fps
-                if msg.is_meta and msg.type == "set_tempo":
-                    tempo = msg.tempo
-                elif msg.type in ("note_on", "note_off"):
-                    note, velocity = msg.note-21, msg.velocity
-                    if velocity == 0 or msg.type == "note_off":
-                        self._notes.append((note, starts[note], curr_frame))
-                    else:
-                        starts[note] = curr_frame
-
-            print_process.clear(print_msg)
+        if self._midi_cache is None:
+            results = [parse_midi(path, self._fps, self._offset) for path in self._midi_paths]
+        else:
+            results = self._midi_cache.parse(self._midi_paths, self._fps, self._offset)
+
+        self._notes = NoteStore.from_midis(results)
 
+        print_process.clear(print_msg)
         print_process.finish(f"Finished parsing {num_midis} midis.")
 
     def _calc_num_frames(self):
-        max_note = max(self._notes, key=(lambda x: x[2]))
-        return int(max_note[2] + 30)
+        return int(self._notes.max_end() + 30)
+
+    def _build_index(self):
+        # Frames a block spends falling from the top of the frame to the keyboard.
+        speed = self._options["blocks.speed"]
+        lookahead = self._res[1] / 2 * self._fps / speed + 1 if speed > 0 else float("inf")
+        self._index = NoteIndex(self._notes, lookahead)
+        self._strip_tiles.clear()
 
     def _prep_render(self):
-        self._parse_midis()
+        with self._stage("parse"):
+            self._parse_midis()
+        with self._stage("index"):
+            self._build_index()
+
+    def _stage(self, name):
+        """Returns a context timing its body as stage name of the export metrics, if they are being collected."""
+        if self._metrics is None:
+            return self._no_stage
+        return self._metrics.stage(name)
+
+    @contextmanager
+    def _profiled(self, path):
+        """Profiles the body with cProfile and writes the stats to path, if it is not None."""
+        if path is None:
+            yield
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(path)
 
-    def _render_piano(self, keys):
-        surface = pygame.Surface((1920, 1080), pygame.SRCALPHA)
-        width_white = self._key_width - self._options["keys.white.gap"]
-        width_black = self._key_width * self._options["keys.black.width_fac"]
-        height_white = self._key_height
-        height_black = self._key_height * self._options["keys.black.height_fac"]
+    def _layer(self, name, size=None, flags=0):
+        """
+        Returns a surface from the layer pool, cleared to transparent black.
+        Each name, size and flags is one buffer reused every frame, so it is only valid until
+        the same layer is requested again.
+        :param size: Size of surface, the video resolution if None.
+        """
+        size = tuple(self._res) if size is None else size
+        key = (name, size, flags)
+        if (surface := self._layers.get(key)) is not None:
+            self._layer_reuses += 1
+            surface.fill((0, 0, 0, 0))
+            return surface
+
+        self._layer_allocs += 1
+        surface = pygame.Surface(size, flags)
+        self._layers[key] = surface
+        return surface
 
+    def _to_bgr(self, surface):
+        """Returns a rendered frame as a BGR array for the encoder, in a pooled array valid until the next call."""
+        if self._frame_bgr is None:
+            self._layer_allocs += 1
+            self._frame_bgr = np.empty((self._res[1], self._res[0], 3), np.uint8)
+        else:
+            self._layer_reuses += 1
+        with self._stage("transfer"):
+            return surface_to_bgr(surface, self._frame_bgr)
+
+    def _key_size(self, white):
+        if white:
+            return self._key_width - self._options["keys.white.gap"], self._key_height
+        return self._key_width * self._options["keys.black.width_fac"], self._key_height * self._options["keys.black.height_fac"]
+
+    def _key_rect(self, white, x_loc):
+        """Returns integer rect covering a key in both idle and pressed state."""
+        width, height = self._key_size(white)
+        return pygame.Rect(int(x_loc), int(self._key_y_loc), int(width)+2, int(height)+3)
+
+    def _get_key_sprite(self, index, white, x_loc):
+        """Returns pressed gradient of a key, blitted at the truncated key location."""
+        if (sprite := self._key_sprites.get(index)) is not None:
+            self._key_sprite_hits += 1
+            return sprite
+        self._key_sprite_misses += 1
+
+        color = self._options["keys.white.color"] if white else self._options["keys.black.color"]
+        width, height = self._key_size(white)
+        height_inc = height / self._key_subdivs
+        sub_height = height/self._key_subdivs + 1
+
+        # Drawn at the fractional offset of the key so truncation matches drawing in place.
+        x_frac = x_loc - int(x_loc)
+        y_frac = self._key_y_loc - int(self._key_y_loc)
+        sprite = pygame.Surface(self._key_rect(white, x_loc).size, pygame.SRCALPHA)
+        key_color = self._key_colors[index]
+        for i in range(self._key_subdivs):
+            curr_col = self._color_mix(key_color, color, i/self._key_subdivs)
+            pygame.draw.rect(sprite, curr_col, (x_frac, y_frac+i*height_inc, width, sub_height))
+
+        self._key_sprites[index] = sprite
+        return sprite
+
+    def _reset_piano(self):
+        self._key_sprites.clear()
+        self._piano_idle = None
+        self._piano_layer = None
+        self._piano_keys = frozenset()
+
+    def _draw_keys(self, surface, keys, clip, idle_white):
+        """
+        Draws keys intersecting clip, whites then blacks.
+        :param keys: Pressed keys, drawn with their sprite.
+        :param clip: Rect to draw in.
+        :param idle_white: Draw idle white keys (else assumed already on the surface).
+        """
+        surface.set_clip(clip)
         for index, white, x_loc in self._key_locs:
-            playing = index in keys
+            if not self._key_rects[index].colliderect(clip):
+                continue
 
-            if playing:
+            if index in keys:
+                surface.blit(self._get_key_sprite(index, white, x_loc), self._key_rects[index])
+            elif idle_white or not white:
                 color = self._options["keys.white.color"] if white else self._options["keys.black.color"]
-                width = width_white if white else width_black
-                height = height_white if white else height_black
-                height_inc = height / self._key_subdivs
-                height /= self._key_subdivs
-                height += 1
-                for i in range(self._key_subdivs):
-                    curr_col = self._color_mix(self._get_color(index), color, i/self._key_subdivs)
-                    pygame.draw.rect(surface, curr_col, (x_loc, self._key_y_loc+i*height_inc, width, height))
-
-            else:
-                color = self._options["keys.white.color"] if white else self._options["keys.black.color"]
-                if white:
-                    pygame.draw.rect(surface, color, (x_loc, self._key_y_loc, width_white, height_white))
-                else:
-                    pygame.draw.rect(surface, color, (x_loc, self._key_y_loc, width_black, height_black))
+                pygame.draw.rect(surface, color, (x_loc, self._key_y_loc, *self._key_size(white)))
 
         pygame.draw.rect(surface, (0, 0, 0), (0, self._res[1]/4*3, self._res[0], self._res[1]/4))
-        return surface
+        surface.set_clip(None)
+
+    def _render_piano(self, keys):
+        """
+        Returns the piano layer with keys pressed.
+        The layer persists between calls, and only keys whose state changed since the last call
+        are redrawn, starting from an idle keyboard layer.
+        """
+        keys = frozenset(keys)
+        if self._piano_idle is None:
+            self._key_rects = [self._key_rect(self._key_white[i], self._key_x[i]) for i in range(88)]
+            self._piano_idle = pygame.Surface(self._res, pygame.SRCALPHA)
+            self._draw_keys(self._piano_idle, (), self._piano_idle.get_rect(), True)
+            self._piano_layer = self._piano_idle.copy()
+            self._piano_keys = frozenset()
+
+        for index in keys ^ self._piano_keys:
+            rect = self._key_rects[index]
+            self._piano_layer.fill((0, 0, 0, 0), rect)
+            self._piano_layer.blit(self._piano_idle, rect, rect)
+            self._draw_keys(self._piano_layer, keys, rect, False)
+
+        self._piano_keys = keys
+        return self._piano_layer
+
+    def _keyboard_pos(self, frame):
+        """
+        Returns how far the keyboard is (pixels) below the start of the note roll on frame, split
+        into whole pixels and the sub pixel phase, rounded so the strip can key tiles by it.
+        """
+        pos = self._res[1]/2 + frame*self._options["blocks.speed"]/self._fps
+        whole = np.floor(pos)
+        return whole, round(pos - whole, 6)
+
+    def _block_spans(self, notes, phase):
+        """
+        Returns tops and bottoms of blocks of notes, relative to the whole pixel keyboard position
+        of a frame with phase. Values are rounded to 1e-6, so a block edge on a whole pixel is on it
+        exactly, and lands on the same row whether drawn per frame or in the strip.
+        """
+        speed = self._options["blocks.speed"]
+        bottoms = np.round(phase - notes.starts/self._fps*speed, 6)
+        tops = np.round(bottoms - (notes.ends-notes.starts)/self._fps*speed, 6)
+        return tops, bottoms
+
+    def _span_rects(self, keys, base, tops, bottoms, trunc):
+        """
+        Returns (n, 4) integer arrays of (x, y, width, height) rects of blocks, and of their motion
+        blur or None, from spans offset by base (whole pixels).
+        :param trunc: Truncate tops towards zero, as pygame does drawing float rects on a frame, so a block cut
+            by the top edge starts a row lower. Otherwise tops are floored, as on strip tiles, which have rows above.
+        """
+        round_top = np.trunc if trunc else np.floor
+        heights = np.round(bottoms - tops, 6)
+        rects = np.empty((len(keys), 4), np.int64)
+        rects[:, 0] = np.trunc(self._block_x[keys])
+        rects[:, 1] = round_top(base + tops)
+        rects[:, 2] = np.trunc(self._block_widths[keys])
+        rects[:, 3] = np.trunc(heights)
+        if not self._options["blocks.motion_blur"]:
+            return rects, None
+
+        mb_dist = self._options["blocks.speed"] / self._fps / 3
+        blur_rects = rects.copy()
+        blur_rects[:, 1] = round_top(base + np.round(tops - mb_dist, 6))
+        blur_rects[:, 3] = np.trunc(np.round(heights + mb_dist, 6))
+        return rects, blur_rects
+
+    def _frame_spans(self, frame):
+        """Returns whole pixel keyboard position, and keys, spans and color indices of blocks visible on frame."""
+        active = self._notes[self._index.active(frame)]
+        whole, phase = self._keyboard_pos(frame)
+        tops, bottoms = self._block_spans(active, phase)
+        visible = (whole + bottoms >= 0) & (whole + tops <= self._res[1]/2)
+        return whole, active.keys[visible], tops[visible], bottoms[visible], active.colors[visible]
+
+    def _block_rects(self, frame):
+        """
+        Returns (n, 4) integer arrays of (x, y, width, height) rects of blocks visible on frame and of
+        their motion blur (None if off), and their color indices.
+        Geometry of all active notes is computed at once, and truncated as pygame does, so the rects
+        are the ones drawing each block from its float position would give.
+        """
+        whole, keys, tops, bottoms, color_inds = self._frame_spans(frame)
+        return *self._span_rects(keys, whole, tops, bottoms, True), color_inds
+
+    def _draw_blocks(self, surface, rects, blur_rects, color_inds):
+        """Draws blocks from integer rects, blur rects (or None) and color indices, in order, with border."""
+        radius = self._options["blocks.rounding"]
+        border = self._options["blocks.border"]
+        border_color = self._options["blocks.color_border"]
+        blur_rects = None if blur_rects is None else blur_rects.tolist()
+
+        for i, (rect, color_ind) in enumerate(zip(rects.tolist(), color_inds.tolist())):
+            if blur_rects is not None:
+                pygame.draw.rect(surface, self._key_colors_blur[color_ind], blur_rects[i], border_radius=radius)
+            pygame.draw.rect(surface, self._key_colors[color_ind], rect, border_radius=radius)
+            if border > 0:
+                pygame.draw.rect(surface, border_color, rect, border, border_radius=radius)
+
+    def _strip_usable(self):
+        """Returns whether the strip is on, and blocks take few enough sub pixel offsets to tile it."""
+        speed = self._options["blocks.speed"]
+        if not self._options["blocks.strip"] or speed <= 0:
+            return False
+        step = Fraction(speed).limit_denominator(1000) / self._fps
+        return step.denominator <= self._strip_max_phases
+
+    def _strip_margin(self):
+        """
+        Returns spare rows drawn past the edges of strip tiles and redrawn rows.
+        pygame draws the border of a block that is short for its rounding up to half its width
+        outside it, differently depending on where the surface edge cuts it, so such surfaces
+        are drawn taller and only rows away from their edges are used.
+        """
+        border = self._options["blocks.border"]
+        return int(self._key_width) + border + 2 if border > 0 else 2
+
+    def _strip_tile(self, index, phase):
+        """
+        Returns a tile of the waterfall strip, the whole note roll drawn once with time going up.
+        Tile i covers blocks from i to i+1 tile heights above the keyboard at frame 0, shifted
+        down by phase, the sub pixel part of the keyboard position, so a frame is the strip
+        scrolled by whole pixels. Tiles are drawn on first use, and the least recently used
+        ones are dropped past _strip_max_tiles.
+        Tiles have spare rows above and below (see _strip_margin), only the middle ones are used.
+        """
+        if (tile := self._strip_tiles.get((index, phase))) is not None:
+            self._strip_tiles.move_to_end((index, phase))
+            return tile
+
+        height = self._strip_tile_height
+        margin = self._strip_margin()
+        mb_dist = self._options["blocks.speed"] / self._fps / 3 if self._options["blocks.motion_blur"] else 0
+        notes = self._notes
+
+        # Same spans as _block_rects, with the keyboard at the bottom of the tile at frame 0.
+        base = (index+1)*height + margin
+        tops, bottoms = self._block_spans(notes, phase)
+        visible = (base + bottoms >= 0) & (base + tops - mb_dist <= height + 2*margin)
+        rects, blur_rects = self._span_rects(notes.keys[visible], base, tops[visible], bottoms[visible], False)
+
+        tile = pygame.Surface((self._res[0], height + 2*margin), pygame.SRCALPHA)
+        self._draw_blocks(tile, rects, blur_rects, notes.colors[visible])
+        tile = tile.subsurface((0, margin, self._res[0], height))
+
+        self._strip_tiles[(index, phase)] = tile
+        if len(self._strip_tiles) > self._strip_max_tiles:
+            self._strip_tiles.popitem(last=False)
+        return tile
+
+    def _draw_rows(self, surface, rects, blur_rects, color_inds, top, bottom):
+        """
+        Redraws rows top to bottom of a blocks surface from the rects of a frame.
+        Blocks are drawn on a scratch surface with spare rows below (see _strip_margin),
+        and above unless it starts at the top of the frame, as the whole frame does.
+        """
+        margin = self._strip_margin()
+        start = max(top - margin, 0)
+        end = bottom + margin
+
+        highest = rects[:, 1] if blur_rects is None else np.minimum(rects[:, 1], blur_rects[:, 1])
+        near = (rects[:, 1] + rects[:, 3] >= start - 1) & (highest <= end + 1)
+        rects, color_inds = rects[near], color_inds[near]
+        blur_rects = None if blur_rects is None else blur_rects[near]
+
+        # A block covering the rows clear of its rounded ends hides the earlier blocks of its key,
+        # which share its columns, so with many held notes only a few blocks per key are drawn.
+        if len(rects) > 0:
+            reach = max(self._options["blocks.rounding"], margin) + 1
+            covers = (rects[:, 1] <= top - reach) & (rects[:, 1] + rects[:, 3] >= bottom + reach)
+            _, key_inds = np.unique(rects[:, 0], return_inverse=True)
+            last = np.full(key_inds.max() + 1, -1)
+            np.maximum.at(last, key_inds[covers], np.flatnonzero(covers))
+            shown = np.arange(len(rects)) >= last[key_inds]
+            rects, color_inds = rects[shown], color_inds[shown]
+            blur_rects = None if blur_rects is None else blur_rects[shown]
+
+        # Whole pixel shift, so blocks keep the rows they have in the frame.
+        rects = rects - [0, start, 0, 0]
+        blur_rects = None if blur_rects is None else blur_rects - [0, start, 0, 0]
+        scratch = self._layer("rows", (self._res[0], end - start), pygame.SRCALPHA)
+        self._draw_blocks(scratch, rects, blur_rects, color_inds)
+
+        surface.fill((0, 0, 0, 0), (0, top, self._res[0], bottom - top))
+        surface.blit(scratch, (0, top), (0, top - start, self._res[0], bottom - top), special_flags=pygame.BLEND_RGBA_MAX)
+
+    def _blit_strip(self, surface, frame):
+        """Copies the part of the waterfall strip above the keyboard on frame onto an empty surface."""
+        height = self._strip_tile_height
+        y_offset = self._res[1] / 2
+        whole, phase = self._keyboard_pos(frame)
+        scroll = whole + phase - y_offset
+
+        for index in range(int(scroll // height), int(whole // height) + 1):
+            y = int(whole) - (index+1)*height
+            # Tiles do not overlap and the surface is empty, so max copies pixels without blending.
+            surface.blit(self._strip_tile(index, phase), (0, y), special_flags=pygame.BLEND_RGBA_MAX)
+
+        # Rows the strip cannot hold are drawn from the frame's blocks. A block cut by the top edge
+        # starts at row 0 rather than above it, as pygame truncates its top towards zero, which moves
+        # its rounded top and its bottom end down a row: its top and bottom rows are redrawn.
+        # The top edge also cuts borders. Above the keyboard, the strip has the blur trail and
+        # border artifacts of blocks that have passed it.
+        border = self._options["blocks.border"]
+        blur = self._options["blocks.motion_blur"]
+        whole, keys, tops, bottoms, color_inds = self._frame_spans(frame)
+        rects, blur_rects = self._span_rects(keys, whole, tops, bottoms, True)
+
+        cut = (whole + tops < 0) & (tops != np.floor(tops))
+        ends = rects[cut, 1] + rects[cut, 3]
+        if blur:
+            mb_dist = self._options["blocks.speed"] / self._fps / 3
+            blur_tops = np.round(tops - mb_dist, 6)
+            blur_cut = (whole + blur_tops < 0) & (blur_tops != np.floor(blur_tops))
+            ends = np.concatenate((ends, blur_rects[blur_cut, 1] + blur_rects[blur_cut, 3]))
+        else:
+            mb_dist = 0
+
+        margin = self._strip_margin() if border > 0 else 0
+        reach = max(self._options["blocks.rounding"], border) + 1
+        bands = []
+        if border > 0 or len(ends) > 0:
+            bands.append((0, max(margin, reach + 1)))
+        bands.extend((int(x) - reach - 1, int(x) + 1) for x in np.unique(ends))
+        if border > 0 or blur:
+            bands.append((int(np.floor(y_offset - mb_dist)) - 1 - margin, int(y_offset) + 1))
+
+        # Merge overlapping bands, so each row is drawn once.
+        merged = []
+        for top, bottom in sorted((max(top, 0), min(bottom, self._res[1])) for top, bottom in bands):
+            if top >= bottom:
+                continue
+            if merged and top <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], bottom)
+            else:
+                merged.append([top, bottom])
+        for top, bottom in merged:
+            self._draw_rows(surface, rects, blur_rects, color_inds, top, bottom)
 
     def _render_blocks(self, frame, playing):
-        surface = pygame.Surface(self._res, pygame.SRCALPHA)
-        width, height = self._res
-        y_offset = height / 2
-        white_width = width * 0.95 / 52
-        black_width = white_width * self._options["keys.black.width_fac"]
+        surface = self._layer("blocks", flags=pygame.SRCALPHA)
+        y_offset = self._res[1] / 2
 
         # Base blocks
-        for key, start, end in self._notes:
-            bottom_y = (frame-start)/self._fps*self._options["blocks.speed"] + y_offset
-            top_y = bottom_y - (end-start)/self._fps*self._options["blocks.speed"]
-
-            visible = bottom_y >= 0 and top_y <= y_offset
-            if visible:
-                x_loc = self._find_x_loc(key)
-                width = white_width if self._is_white(key) else black_width
-                height = bottom_y - top_y
-                color = self._get_color(key)
-
-                radius = self._options["blocks.rounding"]
-                if self._options["blocks.motion_blur"]:
-                    mb_dist = self._options["blocks.speed"] / self._fps / 3
-                    pygame.draw.rect(surface, (*color, 92), (x_loc, top_y-mb_dist, width-1, height+mb_dist), border_radius=radius)
-                pygame.draw.rect(surface, color, (x_loc, top_y, width-1, height), border_radius=radius)
-                if (border := self._options["blocks.border"]) > 0:
-                    pygame.draw.rect(surface, self._options["blocks.color_border"], (x_loc, top_y, width-1, height),
-                        border, border_radius=radius)
+        if self._strip_usable():
+            self._blit_strip(surface, frame)
+        else:
+            self._draw_blocks(surface, *self._block_rects(frame))
 
         # Glowing
-        if self._options["blocks.light"]:
+        if self._options["blocks.light"] and playing:
+            # Glow colors are never black, so a later key overwrites exactly the columns it
+            # shares with an earlier one, and each column can be lit by its last key at once.
+            owner = np.full(self._res[0], -1)
             for key in playing:
-                white = self._is_white(key)
-                x_range = (self._find_x_loc(key), self._find_x_loc(key) + (white_width if white else black_width) + 5)
-                x_range = list(map(int, x_range))
-
-                for i in range(20):
-                    curr_y = self._res[1] // 2 - i
-                    for x in range(*x_range):
-                        curr_loc = (x, curr_y)
-                        color = surface.get_at(curr_loc)
-                        if color[:3] != (0, 0, 0):
-                            fac = i / 20
-                            new_col = self._color_mix((255, 255, 255), self._get_color(key), fac)
-                            surface.set_at(curr_loc, new_col)
+                x_start = max(int(self._key_x[key]), 0)
+                x_end = int(self._key_x[key] + self._key_block_width[key] + 5)
+                owner[x_start:x_end] = key
+            cols = np.flatnonzero(owner >= 0)
+
+            # Band of rows above the keyboard, rows bottom up in the glow table.
+            rows = slice(self._res[1]//2 - self._block_glow_height + 1, self._res[1]//2 + 1)
+            pixels = pygame.surfarray.pixels3d(surface)
+            alpha = pygame.surfarray.pixels_alpha(surface)
+            band = pixels[cols, rows]
+            band_alpha = alpha[cols, rows]
+            lit = band.any(axis=2)
+            band[lit] = self._glow_colors[owner[cols], ::-1][lit]
+            band_alpha[lit] = 255
+            pixels[cols, rows] = band
+            alpha[cols, rows] = band_alpha
+            del pixels, alpha
 
         pygame.draw.rect(surface, (0, 0, 0), (0, y_offset, *self._res))
         return surface
 
+    def _tier_video(self, tier, res=None):
+        """
+        Returns a video rendering this one at a quality tier and resolution: a copy at the tier's
+        share of res with pixel options scaled to match, sharing notes. Copies are rebuilt once
+        options or notes change.
+        :param res: Resolution to render at before the tier's scale, the video's if None.
+        """
+        scale, key_subdivs, tier_options = self._quality_tiers[tier]
+        res = self._res if res is None else tuple(res)
+        if scale == 1 and not tier_options and res == self._res:
+            return self
+        if (cached := self._tier_videos.get((tier, res))) is not None:
+            video, version = cached
+            if version == self._options_version and video._notes is self._notes:
+                return video
+
+        size = (max(int(res[0]*scale), 1), max(int(res[1]*scale), 1))
+        scales = {"x": size[0]/self._res[0], "y": size[1]/self._res[1]}
+        scales["xy"] = min(scales["x"], scales["y"])
+        decor_surf = self._decor_surf
+        if decor_surf is not None:
+            decor_size = [max(int(x*scales["xy"]), 1) for x in decor_surf.get_size()]
+            if decor_surf.get_bitsize() not in (24, 32):
+                # smoothscale needs 24 or 32 bit pixels, e.g. paletted images are copied to 32 bit first.
+                converted = pygame.Surface(decor_surf.get_size(), pygame.SRCALPHA)
+                converted.blit(decor_surf, (0, 0))
+                decor_surf = converted
+            decor_surf = pygame.transform.smoothscale(decor_surf, decor_size)
+
+        video = Video(size, self._fps, self._offset, decor_surf)
+        video._key_subdivs = key_subdivs
+        for path, value in self._options.items():
+            if path in tier_options:
+                value = tier_options[path]
+            elif path in self._pixel_options:
+                value *= scales[self._pixel_options[path]]
+                if path in ("blocks.border", "blocks.rounding"):
+                    value = max(round(value), 1) if value > 0 else 0
+            video.configure(path, value)
+        video._notes = self._notes
+        video._build_index()
+
+        # Keep copies for the last few resolutions, e.g. while resizing the app window.
+        self._tier_videos.pop((tier, res), None)
+        if len(self._tier_videos) >= 2*len(self._quality_tiers):
+            self._tier_videos.pop(next(iter(self._tier_videos)))
+        self._tier_videos[(tier, res)] = (video, self._options_version)
+        return video
+
+    def _auto_tier(self, tier, render_times):
+        """
+        Returns the quality tier for the next frames, given render times (seconds) of recent frames
+        at tier: one tier down if frames take most of the frame time, one up if the next tier,
+        costing about its pixel count, would still leave time to spare.
+        """
+        tiers = list(self._quality_tiers)
+        ind = tiers.index(tier)
+        budget = 1 / self._fps
+        mean = sum(render_times) / len(render_times)
+
+        if mean > budget*0.8 and ind > 0:
+            return tiers[ind-1]
+        if ind < len(tiers)-1:
+            growth = (self._quality_tiers[tiers[ind+1]][0] / self._quality_tiers[tier][0]) ** 2
+            if mean*growth < budget*0.6:
+                return tiers[ind+1]
+        return tier
+
     def _render(self, frame):
-        surface = pygame.Surface(self._res)
+        """Returns frame rendered on a pooled surface, valid until the next call."""
+        surface = self._layer("frame")
 
-        playing = []
-        for note in self._notes:
-            if note[1] <= frame <= note[2]:
-                playing.append(note[0])
-        playing = list(set(playing))
+        playing = self._index.playing(frame)
 
-        surface.blit(self._render_blocks(frame, playing), (0, 0))
-        surface.blit(self._render_piano(playing), (0, 0))
+        with self._stage("blocks"):
+            surface.blit(self._render_blocks(frame, playing), (0, 0))
+        with self._stage("piano"):
+            surface.blit(self._render_piano(playing), (0, 0))
 
         if self._decor_surf is not None:
             width, height = self._decor_surf.get_size()
@@ -299,12 +769,34 @@ class Video:
 
         return surface
 
-    def preview(self, resolution: Tuple[int, int] = (1600, 900), show_meta: bool = True, audio: bool = True) -> None:
+    def _open_writer(self, path):
+        """Returns an opencv writer for path, used when ffmpeg is not installed."""
+        msg = "ffmpeg not found, encoding with opencv"
+        if self._audio_path is not None:
+            msg += " without audio"
+        print(Fore.YELLOW + msg + "." + Fore.WHITE)
+        return cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MPEG"), self._fps, self._res)
+
+    def _abort_writer(self, video, path):
+        video.release()
+        if os.path.isfile(path):
+            os.remove(path)
+
+    def preview(self, resolution: Tuple[int, int] = (1600, 900), show_meta: bool = True, audio: bool = True,
+            quality: str = "auto", prefetch: int = 16) -> None:
         """
         Previews the video with a Pygame window.
         :param resolution: Resolution of window.
         :param audio: Play with audio but no jumping forward or backward.
+        :param quality: Quality tier ("draft", "preview" or "final"), or "auto" to pick the best tier
+            that keeps up with the fps, checked every second.
+        :param prefetch: Maximum frames rendered ahead in the background, at least 1. Frames not ready in time are dropped.
         """
+        if quality != "auto" and quality not in self._quality_tiers:
+            raise ValueError(f"Unknown quality {quality}, must be auto or one of {', '.join(self._quality_tiers)}")
+        if prefetch < 1:
+            raise ValueError("prefetch must be at least 1")
+
         try:
             from playsound import playsound
         except ModuleNotFoundError:
@@ -321,29 +813,23 @@ class Video:
             else:
                 return
 
-        def get_note_info(frame):
-            notes = self._notes
-            info = {"played": 0, "playing": 0, "to_play": 0}
-            for note in notes:
-                start, end = note[1], note[2]
-                if frame < start:
-                    info["to_play"] += 1
-                elif frame >= start:
-                    info["played"] += 1
-                    if frame <= end:
-                        info["playing"] += 1
-
-            return info
-
         def play_audio(path):
             time.sleep(0.03)
             playsound(path)
 
+        def render(frame):
+            frame_tier = tier
+            start = time.time()
+            surface = pygame.transform.scale(self._tier_video(frame_tier)._render(frame), resolution)
+            return surface, time.time()-start, frame_tier
+
+        init_console()
         self._prep_render()
         total_frames = self._calc_num_frames()
 
+        pygame.init()
         pygame.display.set_caption("PianoVis - Preview")
-        pygame.display.set_icon(LOGO)
+        pygame.display.set_icon(get_logo())
         window = pygame.display.set_mode(resolution)
         font = pygame.font.SysFont("ubuntu", 14)
 
@@ -351,6 +837,12 @@ class Video:
         frame = 0
         fps = self._fps
         playing = True
+        tier = "final" if quality == "auto" else quality
+        render_times = []
+        prefetcher = FramePrefetcher(render, frame, total_frames, prefetch)
+        shown_frame = None
+        surface = pygame.Surface(resolution)
+        rend_time = 0
         if audio and self._audio_path is not None:
             threading.Thread(target=play_audio, args=(self._audio_path,)).start()
 
@@ -360,6 +852,7 @@ class Video:
             pygame.display.update()
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    prefetcher.stop()
                     pygame.quit()
                     return
 
@@ -377,195 +870,296 @@ class Video:
 
                     frame = min(frame, total_frames-1)
                     frame = max(frame, 0)
+                    if shown_frame is not None and frame-shown_frame not in (0, 1):
+                        prefetcher.seek(frame)
 
             window.fill((0, 0, 0))
-            rend_start = time.time()
-            surface = self._render(frame)
-            rend_time = str(time.time() - rend_start)[:6]
-            idle_time = str((1/self._fps) - float(rend_time))[:6]
-
-            surface = pygame.transform.scale(surface, resolution)
+            if frame != shown_frame and (result := prefetcher.get(frame, wait=not playing)) is not None:
+                surface, rend_time, frame_tier = result
+                shown_frame = frame
+                if frame_tier == tier:
+                    render_times.append(rend_time)
+                if len(render_times) >= self._fps:
+                    if quality == "auto":
+                        tier = self._auto_tier(tier, render_times)
+                    render_times = []
             window.blit(surface, (0, 0))
 
             if show_meta:
-                note_info = get_note_info(frame)
+                note_info = self.note_stats(frame)
                 num_to_play = note_info["to_play"]
                 num_playing = note_info["playing"]
                 num_played = note_info["played"]
 
                 window.blit(font.render(f"Frame: {frame}", 1, (255, 255, 255)), (20, 20))
-                window.blit(font.render(f"Render time: {rend_time}", 1, (255, 255, 255)), (20, 40))
-                window.blit(font.render(f"Idle time: {idle_time}", 1, (255, 255, 255)), (20, 60))
-                window.blit(font.render(f"FPS: {fps}", 1, (255, 255, 255)), (20, 80))
-                window.blit(font.render(f"Notes to play: {num_to_play}", 1, (255, 255, 255)), (20, 100))
-                window.blit(font.render(f"Notes playing: {num_playing}", 1, (255, 255, 255)), (20, 120))
-                window.blit(font.render(f"Notes played: {num_played}", 1, (255, 255, 255)), (20, 140))
+                window.blit(font.render(f"Render time: {str(rend_time)[:6]}", 1, (255, 255, 255)), (20, 40))
+                window.blit(font.render(f"Queue: {prefetcher.qsize()} of {prefetch}", 1, (255, 255, 255)), (20, 60))
+                window.blit(font.render(f"Dropped frames: {prefetcher.dropped}", 1, (255, 255, 255)), (20, 80))
+                window.blit(font.render(f"FPS: {fps}", 1, (255, 255, 255)), (20, 100))
+                window.blit(font.render(f"Quality: {tier}", 1, (255, 255, 255)), (20, 120))
+                window.blit(font.render(f"Notes to play: {num_to_play}", 1, (255, 255, 255)), (20, 140))
+                window.blit(font.render(f"Notes playing: {num_playing}", 1, (255, 255, 255)), (20, 160))
+                window.blit(font.render(f"Notes played: {num_played}", 1, (255, 255, 255)), (20, 180))
 
             fps = str(1 / (time.time() - start))[:6]
-            if playing and frame < total_frames:
+            if playing and frame < total_frames-1:
                 frame += 1
 
-    def export(self, path: str, multicore: bool = False, max_cores: int = multiprocessing.cpu_count(), notify: bool = False) -> None:
-        """
-        Exports video to path.
-        :param path: Path to export, must be .mp4
-        :param multicore: Uses multiple cores to export video. This may be faster, but takes more power and uses more disk space.
-        :param max_cores: Maximum cores to use when exporting.
-        :param notify: Sends notification when done exporting (requres win10toast on Windows, does not work on Mac).
-        """
-        def multicore_video(path, frames):
-            video = cv2.VideoWriter(tmp_vid_path, cv2.VideoWriter_fourcc(*"MPEG"), self._fps, self._res)
-            start = time.time()
-            for i in range(frames):
-                msg = f"Encoding frame {i} of {frames}"
-                elapse = time.time() - start
-                left = (frames-i-1) * elapse / (i+1)
-                percent = (i+1) / frames
-                progress = int(percent * 50)
-                progress_msg = "[{}{}] {}%".format("#"*int(progress), "-"*int(50-progress), int(percent*100))
-                final_msg = "{}    Remaining: {}    {}".format(msg, str(left)[:6], progress_msg)
-                print_process.write(final_msg)
-
-                if os.path.isfile(curr_img_path := os.path.join(path, f"{i}.png")):
-                    video.write(cv2.imread(curr_img_path))
-                print_process.clear(final_msg)
-
-            print_process.finish(f"Finished encoding {frames} frames.")
-            video.release()
+    def _show_progress(self, progress, msg, done, callback):
+        """Updates progress and metrics with done frames, calling callback whenever progress is shown."""
+        self._metrics.frames_done = done
+        if progress.update(msg, done) and callback is not None:
+            callback(self._metrics)
 
-        def multicore_export(path, start, end):
-            for frame in range(start, end+1):
-                surface = self._render(frame)
-                filepath = os.path.join(path, f"{frame}.png")
-                pygame.image.save(surface, filepath)
+    def _merge_worker_metrics(self, results):
+        """Merges metrics samples sent back by worker processes so far."""
+        while True:
+            try:
+                self._metrics.merge(results.get_nowait())
+            except Empty:
+                return
 
-        if not path.endswith(".mp4"):
-            raise ValueError("Path must end with .mp4")
+    def _join_workers(self, processes, results):
+        """Waits for worker processes to exit, merging the metrics they send back."""
+        while any(p.is_alive() for p in processes):
+            self._merge_worker_metrics(results)
+            time.sleep(0.05)
+        self._merge_worker_metrics(results)
+        for p in processes:
+            p.join()
+
+    def _export_single(self, path, frames, callback, profile):
+        video = self._open_writer(path)
+        try:
+            progress = ProgressLine(frames)
+            with self._profiled(profile):
+                for i in range(frames):
+                    frame = self._to_bgr(self._render(i))
+                    with self._stage("encode"):
+                        video.write(frame)
+                    self._show_progress(progress, f"Exporting frame {i} of {frames}", i+1, callback)
+            progress.clear()
 
-        print("-" * 50)
-        print(f"Exporting video:")
+            print_process.finish(f"Finished exporting {frames} frames.")
 
-        # Setup export
-        get_hash = lambda: sha256(str(time.time()).encode()).hexdigest()[:20]
-        parent = os.path.realpath(os.path.dirname(__file__))
+            video.release()
 
-        hash = get_hash()
-        self._prep_render()
-        frames = self._calc_num_frames()
+        except KeyboardInterrupt:
+            print(Fore.RED + "Keyboard interrupt")
+            self._abort_writer(video, path)
+            return False
+
+        return True
+
+    def _export_ring(self, path, frames, num_cores, callback, profile):
+        def multicore_export(ring, frames, results, profile):
+            self._metrics = ExportMetrics()
+            with self._profiled(profile):
+                while (frame := ring.take(frames)) is not None:
+                    surface = self._render(frame)
+                    with self._stage("transfer"):
+                        ring.put(frame, surface)
+            results.put(self._metrics.samples)
+
+        processes = []
+        video = self._open_writer(path)
+        ring = FrameRing(self._res, num_cores*self._ring_slots_per_core)
+        results = multiprocessing.Queue()
+        finished = False
 
-        # Export frames
-        if multicore:
-            num_cores = min(multiprocessing.cpu_count(), max_cores)
-            processes = []
+        try:
+            for i in range(num_cores):
+                worker_profile = None if profile is None else f"{profile}.{i}"
+                process = multiprocessing.Process(target=multicore_export, args=(ring, frames, results, worker_profile))
+                process.start()
+                processes.append(process)
+
+            # A crashed worker never fills its slot and the others wait on it, so stop at the first failure.
+            healthy = lambda: all(p.exitcode in (None, 0) for p in processes) and any(p.is_alive() for p in processes)
+            progress = ProgressLine(frames)
+            for i, frame in enumerate(ring.frames(frames, healthy)):
+                with self._stage("encode"):
+                    video.write(frame)
+                self._show_progress(progress, f"Exporting frame {i} of {frames}", i+1, callback)
+            del frame
+            progress.clear()
+
+            self._join_workers(processes, results)
+            for p in processes:
+                if p.exitcode != 0:
+                    raise RuntimeError(f"Render worker exited with code {p.exitcode}.")
+            print_process.finish(f"Finished exporting {frames} frames.")
 
-            tmp_imgs_path = os.path.join(parent, hash)
-            tmp_vid_path = os.path.join(parent, hash+".mp4")
-            os.makedirs(tmp_imgs_path)
+            video.release()
+            finished = True
 
-            try:
-                curr_start = 0
-                inc = frames / num_cores
-                total_frames = 0
-                for i in range(num_cores):
-                    start = int(curr_start)
-                    end = int(curr_start + inc)
-                    total_frames += end - start + 1
+        except KeyboardInterrupt:
+            print(Fore.RED + "Keyboard Interrupt.")
+            print(Fore.WHITE + "Removing unfinished video.")
+            return False
 
-                    process = multiprocessing.Process(target=multicore_export, args=(tmp_imgs_path, start, end))
-                    process.start()
-                    processes.append(process)
+        finally:
+            for p in processes:
+                if p.is_alive():
+                    p.terminate()
+            if not finished:
+                self._abort_writer(video, path)
+            ring.close()
+
+        return True
+
+    def _export_key(self):
+        """Returns a key of everything that affects rendered frames, used to name the segment directory."""
+        key = sha256()
+        for path in self._midi_paths:
+            with open(path, "rb") as file:
+                key.update(file.read())
+        key.update(repr((RENDER_VERSION, self._segment_frames, self._res, self._fps, self._offset,
+            sorted(self._options.items()))).encode())
+        if self._decor_surf is not None:
+            key.update(pygame.image.tobytes(self._decor_surf, "RGBA"))
+        return key.hexdigest()[:20]
 
-                    curr_start += inc + 1
+    def _render_segment(self, path, start, end):
+        """
+        Renders frames start to end-1 into a segment, yielding after each frame.
+        The segment is written under a temporary name and renamed once complete.
+        """
+        tmp_path = path[:-4] + ".part.mp4"
+        video = FFmpegWriter(tmp_path, self._res, self._fps, None, self._options["export.codec"],
+            self._options["export.preset"], self._options["export.crf"])
+        for frame in range(start, end):
+            bgr = self._to_bgr(self._render(frame))
+            with self._stage("encode"):
+                video.write(bgr)
+            yield frame
+        video.release()
+        os.replace(tmp_path, path)
+
+    def _export_segments(self, path, frames, num_cores, callback, profile):
+        def segment_export(queue, done, results, profile):
+            self._metrics = ExportMetrics()
+            with self._profiled(profile):
+                while (segment := queue.get()) is not None:
+                    for _ in self._render_segment(*segment):
+                        with done.get_lock():
+                            done.value += 1
+            results.put(self._metrics.samples)
+
+        # Segments are fixed size and named after their first frame, so an interrupted export with
+        # the same midis and settings can reuse every finished segment, whatever the core count.
+        seg_dir = os.path.join(os.path.dirname(os.path.realpath(path)), ".pianovis_"+self._export_key())
+        os.makedirs(seg_dir, exist_ok=True)
+        bounds = list(range(0, frames, self._segment_frames)) + [frames]
+        segments = [(os.path.join(seg_dir, f"{bounds[i]}.mp4"), bounds[i], bounds[i+1]) for i in range(len(bounds)-1)]
+        todo = [segment for segment in segments if not os.path.isfile(segment[0])]
+        num_done = frames - sum(end-start for _, start, end in todo)
+        if num_done > 0:
+            print(f"Resuming export, {len(segments)-len(todo)} of {len(segments)} segments already rendered.")
+
+        processes = []
+        num_cores = min(num_cores, len(todo))
+        try:
+            progress = ProgressLine(frames)
+            if num_cores <= 1:
+                with self._profiled(profile):
+                    for segment in todo:
+                        for frame in self._render_segment(*segment):
+                            num_done += 1
+                            self._show_progress(progress, f"Exporting frame {frame} of {frames}", num_done, callback)
+                progress.clear()
 
-                start = time.time()
-                while True:
-                    num_frames = len(os.listdir(tmp_imgs_path))
-                    msg = f"Rendering frames, {num_frames}/{total_frames} finished."
-                    elapse = time.time() - start
-                    left = (total_frames-num_frames-1) * elapse / (num_frames+1)
-                    percent = (num_frames+1) / total_frames
-                    progress = int(percent * 50)
-                    progress_msg = "[{}{}] {}%".format("#"*int(progress), "-"*int(50-progress), int(percent*100))
-                    final_msg = "{}    Remaining: {}    {}".format(msg, str(left)[:6], progress_msg)
-                    print_process.write(final_msg)
+            else:
+                queue = multiprocessing.Queue()
+                for segment in todo:
+                    queue.put(segment)
+                for i in range(num_cores):
+                    queue.put(None)
 
-                    if num_frames >= total_frames:
-                        print_process.clear(final_msg)
-                        break
+                done = multiprocessing.Value("q", num_done)
+                results = multiprocessing.Queue()
+                for i in range(num_cores):
+                    worker_profile = None if profile is None else f"{profile}.{i}"
+                    process = multiprocessing.Process(target=segment_export, args=(queue, done, results, worker_profile))
+                    process.start()
+                    processes.append(process)
 
-                    time.sleep(0.01)
-                    print_process.clear(final_msg)
+                while any(p.is_alive() for p in processes):
+                    num_frames = done.value
+                    self._show_progress(progress, f"Rendering frames, {num_frames}/{frames} finished.", num_frames, callback)
+                    self._merge_worker_metrics(results)
+                    time.sleep(0.1)
+                progress.clear()
 
+                self._join_workers(processes, results)
                 for p in processes:
-                    p.join()
-                print_process.finish("Finished rendering frames.")
+                    if p.exitcode != 0:
+                        raise RuntimeError(f"Segment render worker exited with code {p.exitcode}.")
 
-                video_process = multiprocessing.Process(target=multicore_video, args=(tmp_imgs_path, frames))
-                video_process.start()
-                processes.append(video_process)
+            print_process.finish(f"Finished exporting {frames} frames in {len(segments)} segments.")
 
-                video_process.join()
-                cv2.destroyAllWindows()
+            print(Fore.WHITE + "Joining segments")
+            with self._stage("mux"):
+                concat_segments([segment[0] for segment in segments], path, self._audio_path)
 
-            except KeyboardInterrupt:
-                for p in processes:
-                    p.terminate()
-                shutil.rmtree(tmp_imgs_path)
-                if os.path.isfile(tmp_vid_path):
-                    os.remove(tmp_vid_path)
-                print(Fore.RED + "Keyboard Interrupt.")
-                print(Fore.WHITE + "Removing temporary files.")
-                return
+        except KeyboardInterrupt:
+            for p in processes:
+                p.terminate()
+            print(Fore.RED + "Keyboard Interrupt.")
+            print(Fore.WHITE + f"Finished segments are kept in {seg_dir}, export again to resume.")
+            return False
 
-            shutil.rmtree(tmp_imgs_path)
+        shutil.rmtree(seg_dir)
+        return True
 
-        else:
-            tmp_img_path = os.path.join(parent, hash+".png")
-            tmp_vid_path = os.path.join(parent, hash+".mp4")
-            video = cv2.VideoWriter(tmp_vid_path, cv2.VideoWriter_fourcc(*"MPEG"), self._fps, self._res)
+    def export(self, path: str, multicore: bool = False, max_cores: int = multiprocessing.cpu_count(), notify: bool = False,
+            report: Optional[str] = None, callback: Optional[Callable[[ExportMetrics], None]] = None,
+            profile: Optional[str] = None) -> Optional[ExportMetrics]:
+        """
+        Exports video to path.
+        :param path: Path to export, must be .mp4
+        :param multicore: Uses multiple cores to export video. This may be faster, but takes more power and memory.
+        :param max_cores: Maximum cores to use when exporting.
+        :param notify: Sends notification when done exporting (requres win10toast on Windows, does not work on Mac).
+        :param report: Path to write the stage timings to as JSON when done.
+        :param callback: Called with the metrics whenever progress is shown, and once when done.
+        :param profile: Path to write cProfile stats of the frame loop to, with .0, .1... appended per core if multicore.
+        :return: Metrics with the timings of each stage, None if interrupted.
+        """
+        if not path.endswith(".mp4"):
+            raise ValueError("Path must end with .mp4")
 
-            try:
-                start = time.time()
-                for i in range(frames):
-                    msg = f"Exporting frame {i} of {frames}"
-                    elapse = time.time() - start
-                    left = (frames-i-1) * elapse / (i+1)
-                    percent = (i+1) / frames
-                    progress = int(percent * 50)
-                    progress_msg = "[{}{}] {}%".format("#"*int(progress), "-"*int(50-progress), int(percent*100))
-                    final_msg = "{}    Remaining: {}    {}".format(msg, str(left)[:6], progress_msg)
-                    print_process.write(final_msg)
-
-                    surf = self._render(i)
-                    pygame.image.save(surf, tmp_img_path)
-                    video.write(cv2.imread(tmp_img_path))
-
-                    print_process.clear(final_msg)
-
-                print_process.finish(f"Finished exporting {frames} frames.")
-
-                video.release()
-                cv2.destroyAllWindows()
-
-            except KeyboardInterrupt:
-                print(Fore.RED + "Keyboard interrupt")
-                os.remove(tmp_img_path)
-                os.remove(tmp_vid_path)
-                return
+        init_console()
+        print("-" * 50)
+        print(f"Exporting video:")
 
-            os.remove(tmp_img_path)
+        metrics = self._metrics = ExportMetrics()
+        try:
+            # Setup export
+            self._prep_render()
+            frames = metrics.frames_total = self._calc_num_frames()
+
+            # Export frames
+            num_cores = min(multiprocessing.cpu_count(), max_cores) if multicore else 1
+            if FFmpegWriter.available():
+                finished = self._export_segments(path, frames, num_cores, callback, profile)
+            elif multicore:
+                finished = self._export_ring(path, frames, num_cores, callback, profile)
+            else:
+                finished = self._export_single(path, frames, callback, profile)
+        finally:
+            self._metrics = None
 
-        # Combine audio and video
-        shutil.copy(tmp_vid_path, "no_audio_"+path)
-        if self._audio_path is not None:
-            print(Fore.WHITE + "Combining with audio")
-            command = "ffmpeg -y -i {} -r {} -i {} -filter:a aresample=async=1 -c:a aac -c:v copy {}"
-            command = command.format(self._audio_path, self._fps, tmp_vid_path, path)
-            os.system(command)
-        os.remove(tmp_vid_path)
+        if not finished:
+            return None
 
         print_process.finish("Finished exporting animation.")
+        if report is not None:
+            metrics.save(report)
+            print(f"Wrote stage timings to {report}")
         print(Fore.WHITE + "-" * 50)
+        if callback is not None:
+            callback(metrics)
 
         if notify:
             if sys.platform == "linux":
@@ -577,3 +1171,5 @@ class Video:
                     toast.show_toast("Piano Vis", "Finished exporting an animation!", duration=10)
                 except ModuleNotFoundError:
                     print("win10toast not found. Install with \"pip install win10toast\" to show notifications.")
+
+        return metrics
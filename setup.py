@@ -34,9 +34,13 @@ setuptools.setup(
     install_requires=[
         "pygame",
         "opencv-python",
+        "numpy",
         "mido",
         "colorama",
     ],
+    entry_points={
+        "console_scripts": ["pianovis=pianovis.cli:main"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: GNU General Public License v2 or later (GPLv2+)",